@@ -1,7 +1,7 @@
-import sounddevice as sd
 import numpy as np
 import wave
 import os
+import threading
 from datetime import datetime
 
 class AudioRecorder:
@@ -13,6 +13,8 @@ class AudioRecorder:
         
     def record_audio(self):
         """Record audio for a specified duration."""
+        import sounddevice as sd  # Imported on first use, it initializes PortAudio
+        
         print(f"Recording for {self.duration} seconds...")
         self.recording = sd.rec(
             int(self.duration * self.sample_rate),
@@ -51,11 +53,37 @@ class AudioRecorder:
         print(f"Recording saved to {filepath}")
         return filepath
     
+    def save_recording_async(self, filename, directory="recordings"):
+        """Save the current recording to a WAV file on a background thread.
+        
+        The buffer is snapshotted first, so a new recording can start while the
+        file is being written. Returns the thread and the target path.
+        """
+        if self.recording is None:
+            raise ValueError("No recording available to save")
+        
+        snapshot = AudioRecorder(self.sample_rate, self.channels, self.duration)
+        snapshot.recording = self.recording.copy()
+        
+        if not filename.endswith('.wav'):
+            filename += '.wav'
+        filepath = os.path.join(directory, filename)
+        
+        thread = threading.Thread(
+            target=snapshot.save_recording,
+            args=(filename, directory),
+            daemon=True
+        )
+        thread.start()
+        return thread, filepath
+    
     def play_recording(self):
         """Play back the recorded audio."""
         if self.recording is None:
             raise ValueError("No recording available to play")
             
+        import sounddevice as sd
+        
         print("Playing recording...")
         sd.play(self.recording, self.sample_rate)
         sd.wait()
@@ -0,0 +1,147 @@
+import time
+import tracemalloc
+import numpy as np
+
+def _time_per_call(func, repeats):
+    """Average wall-clock seconds per call after one warm-up call."""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+def _synthetic_utterance(sr=16000, duration=3, seed=0):
+    """A voiced-like test signal with leading and trailing silence, so benchmarks do not need a microphone."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sr * duration)) / sr
+    f0 = 120 + 10 * seed
+    voiced = 0.3 * np.sin(2 * np.pi * f0 * t * (1 + 0.05 * np.sin(3 * t))) + 0.1 * np.sin(2 * np.pi * 3 * f0 * t)
+    envelope = np.clip(np.minimum(t - 0.4, duration - 0.6 - t) * 20, 0, 1)
+    return (envelope * voiced + 0.003 * rng.standard_normal(len(t))).astype(np.float32)
+
+def bench_mfcc(repeats=50, sr=16000, n_mfcc=13, n_fft=2048, hop_length=512):
+    """Compare librosa's MFCC + delta path with the built-in kernel per utterance."""
+    import librosa
+    from mfcc_kernel import get_kernel
+    
+    y = _synthetic_utterance(sr)
+    
+    def with_librosa():
+        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
+        return np.vstack([mfccs, librosa.feature.delta(mfccs), librosa.feature.delta(mfccs, order=2)]).T
+    
+    kernel = get_kernel(sr, n_fft, n_mfcc, hop_length)
+    
+    def with_kernel():
+        return kernel.features(y[None, :])[0]
+    
+    max_error = np.abs(with_librosa() - with_kernel()).max()
+    librosa_time = _time_per_call(with_librosa, repeats)
+    kernel_time = _time_per_call(with_kernel, repeats)
+    
+    print("=== MFCC + deltas per utterance ===")
+    print(f"librosa: {librosa_time * 1000:.2f} ms")
+    print(f"kernel:  {kernel_time * 1000:.2f} ms")
+    print(f"speedup: {librosa_time / kernel_time:.1f}x (max abs difference {max_error:.2e})")
+    return librosa_time, kernel_time
+
+def _peak_allocated(func):
+    """Peak bytes allocated while running func (NumPy reports to tracemalloc)."""
+    func()  # Warm caches and workspaces first
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def profile_verification_memory(sr=16000):
+    """Compare peak memory of one verification in float64 and float32 modes."""
+    from sklearn.mixture import GaussianMixture
+    from gmm_scoring import DiagGMMScorer
+    from voice_processor import RunningStats, VoiceProcessor
+    
+    enrollment = [_synthetic_utterance(sr, seed=seed) for seed in range(3)]
+    y = _synthetic_utterance(sr, seed=3)
+    peaks = {}
+    
+    for dtype in (np.float64, np.float32):
+        processor = VoiceProcessor(dtype=dtype)
+        stats = RunningStats()
+        features = [processor.extract_features_from_array(sample, sr) for sample in enrollment]
+        for sample_features in features:
+            stats.update(sample_features)
+        gmm = GaussianMixture(n_components=16, covariance_type='diag', random_state=42)
+        gmm.fit(stats.transform(np.vstack(features)))
+        scorer = DiagGMMScorer.from_gmm(gmm)
+        
+        def verify():
+            return scorer.score(processor.process_verification_audio(y, sr, stats))
+        
+        peaks[np.dtype(dtype).name] = _peak_allocated(verify)
+    
+    print("=== Peak allocation per verification ===")
+    for name, peak in peaks.items():
+        print(f"{name}: {peak / 1024:.0f} KiB")
+    print(f"reduction: {1 - peaks['float32'] / peaks['float64']:.0%}")
+    return peaks
+
+def bench_gmm_scoring(repeats=200, n_frames=300, n_features=39, n_components=16):
+    """Compare GaussianMixture.score with the diagonal-GMM scoring kernel."""
+    from sklearn.mixture import GaussianMixture
+    from gmm_scoring import DiagGMMScorer
+    
+    rng = np.random.default_rng(0)
+    gmm = GaussianMixture(n_components=n_components, covariance_type='diag', random_state=42)
+    gmm.fit(rng.standard_normal((20 * n_components, n_features)))
+    scorer = DiagGMMScorer.from_gmm(gmm)
+    X = rng.standard_normal((n_frames, n_features))
+    
+    max_error = abs(gmm.score(X) - scorer.score(X))
+    sklearn_time = _time_per_call(lambda: gmm.score(X), repeats)
+    kernel_time = _time_per_call(lambda: scorer.score(X), repeats)
+    
+    print(f"=== GMM scoring ({n_frames} frames, {n_components} components) ===")
+    print(f"sklearn: {sklearn_time * 1e6:.0f} us")
+    print(f"kernel:  {kernel_time * 1e6:.0f} us")
+    print(f"speedup: {sklearn_time / kernel_time:.1f}x (score difference {max_error:.2e})")
+    return sklearn_time, kernel_time
+
+def bench_compact_models(n_models=200, n_frames=300, n_features=39, n_components=16):
+    """Compare model bytes and likelihood-ratio accuracy of quantized (CompactGMM) models."""
+    from sklearn.mixture import GaussianMixture
+    from gmm_scoring import CompactGMM, DiagGMMScorer
+    
+    rng = np.random.default_rng(0)
+    gmm = GaussianMixture(n_components=n_components, covariance_type='diag', random_state=42)
+    gmm.fit(rng.standard_normal((20 * n_components, n_features)) * rng.uniform(0.5, 2, n_features))
+    ubm = DiagGMMScorer.from_gmm(gmm)
+    
+    # MAP-like user models: shifted means, shared UBM variances; each scored on its own utterance
+    models = [DiagGMMScorer(ubm.weights, ubm.means + 0.3 * rng.standard_normal(ubm.means.shape), ubm.precisions)
+              for _ in range(n_models)]
+    utterances = [model.means[rng.integers(n_components, size=n_frames)] + rng.standard_normal((n_frames, n_features))
+                  for model in models]
+    impostors = utterances[1:] + utterances[:1]
+    
+    def llrs(scorers):
+        return np.array([[m.score(X) - ubm.score(X) for X in (genuine, impostor)]
+                         for m, genuine, impostor in zip(scorers, utterances, impostors)])
+    
+    reference = llrs(models)
+    print(f"=== Compact models ({n_components} components x {n_features} features) ===")
+    print(f"{'float64':<22} {models[0].nbytes:6d} bytes")
+    for dtype in ('float16', 'int8'):
+        for shared in (False, True):
+            compact = [CompactGMM.from_scorer(m, dtype, ubm.precisions if shared else None) for m in models]
+            error = np.abs(llrs(compact) - reference)
+            flips = np.mean((llrs(compact) > 0) != (reference > 0))
+            label = f"{dtype}{' shared var' if shared else ''}"
+            print(f"{label:<22} {compact[0].nbytes:6d} bytes ({models[0].nbytes / compact[0].nbytes:4.1f}x smaller), "
+                  f"LLR error max {error.max():.2e} mean {error.mean():.2e}, decisions changed {flips:.2%}")
+
+if __name__ == "__main__":
+    bench_mfcc()
+    profile_verification_memory()
+    bench_gmm_scoring()
+    bench_compact_models()
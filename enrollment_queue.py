@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class EnrollmentCancelled(Exception):
+    """Raised inside a job's worker when the job has been cancelled."""
+
+class EnrollmentJob:
+    """Handle for a submitted enrollment: progress, cancellation and completion.
+    
+    Progress events are (stage, done, total) tuples with stage one of
+    'queued', 'extraction', 'em', 'map', 'saving' and 'done'. They are kept
+    in `events` and passed to `on_progress`, which runs on the worker
+    thread (GUI callers should hand them over to their event loop).
+    """
+    
+    def __init__(self, user_id, samples, on_progress=None):
+        self.user_id = user_id
+        self.samples = list(samples)
+        self.on_progress = on_progress
+        self.events = []
+        self.status = 'queued'  # queued, running, done, failed or cancelled
+        self.error = None
+        self.model = None
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+        
+    def _report(self, stage, done=0, total=0):
+        if self._cancelled.is_set() and stage != 'done':  # Too late once the model is saved
+            raise EnrollmentCancelled(self.user_id)
+        with self._lock:
+            self.events.append((stage, done, total))
+        if self.on_progress is not None:
+            self.on_progress(self, stage, done, total)
+    
+    @property
+    def progress(self):
+        """The latest (stage, done, total) event."""
+        with self._lock:
+            return self.events[-1] if self.events else ('queued', 0, 0)
+    
+    def cancel(self):
+        """Ask the job to stop; it stops at its next progress event without saving."""
+        self._cancelled.set()
+        
+    def cancelled(self):
+        return self.status == 'cancelled'
+    
+    def done(self):
+        return self._finished.is_set()
+    
+    def wait(self, timeout=None):
+        """Block until the job finishes and return the trained model.
+        
+        Raises the training error if the job failed, EnrollmentCancelled if
+        it was cancelled and TimeoutError if `timeout` seconds pass first.
+        """
+        if not self._finished.wait(timeout):
+            raise TimeoutError(f"Enrollment of {self.user_id} still running")
+        if self.status == 'cancelled':
+            raise EnrollmentCancelled(self.user_id)
+        if self.error is not None:
+            raise self.error
+        return self.model
+
+class EnrollmentQueue:
+    """Runs enrollments (feature extraction, training, saving) on a worker pool."""
+    
+    def __init__(self, processor, verifier, max_workers=2):
+        self.processor = processor
+        self.verifier = verifier
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="enroll")
+        
+    def submit(self, user_id, samples, on_progress=None):
+        """Queue an enrollment from a list of WAV paths and return its EnrollmentJob."""
+        job = EnrollmentJob(user_id, samples, on_progress)
+        job._report('queued')
+        self._executor.submit(self._run, job)
+        return job
+    
+    def _run(self, job):
+        job.status = 'running'
+        try:
+            job._report('extraction', 0, len(job.samples))
+            features, stats, lengths = self.processor.process_enrollment_samples(
+                job.samples, return_stats=True, return_lengths=True)
+            job._report('extraction', len(job.samples), len(job.samples))
+            job.model = self.verifier.train_model(job.user_id, features, stats, on_progress=job._report,
+                                                  lengths=lengths)
+            job.status = 'done'
+            job._report('done', 1, 1)
+        except EnrollmentCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.error = e
+            job.status = 'failed'
+        finally:
+            job._finished.set()
+    
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,164 @@
+import argparse
+import os
+import time
+import numpy as np
+
+def find_labeled_wavs(data_dir):
+    """List (path, speaker) pairs: speaker subdirectories, or `<speaker>_<anything>.wav` names."""
+    pairs = []
+    for root, _, files in os.walk(data_dir):
+        for filename in sorted(files):
+            if not filename.lower().endswith(".wav"):
+                continue
+            if os.path.normpath(root) != os.path.normpath(data_dir):
+                speaker = os.path.basename(root)
+            else:
+                speaker = filename.split("_", 1)[0]
+            pairs.append((os.path.join(root, filename), speaker))
+    return sorted(pairs)
+
+def error_rates(genuine, impostor):
+    """False-reject and false-accept rates at every candidate threshold.
+    
+    A trial is accepted when its score is above the threshold, as in
+    SpeakerVerifier. Returns (thresholds, frr, far), thresholds ascending.
+    """
+    genuine = np.sort(genuine)
+    impostor = np.sort(impostor)
+    thresholds = np.concatenate([[-np.inf], genuine, impostor])
+    thresholds.sort()
+    frr = np.searchsorted(genuine, thresholds, side='right') / len(genuine)
+    far = 1 - np.searchsorted(impostor, thresholds, side='right') / len(impostor)
+    return thresholds, frr, far
+
+def equal_error_rate(thresholds, frr, far):
+    """The EER and its threshold, where FRR and FAR cross."""
+    i = np.argmin(np.abs(frr - far))
+    return (frr[i] + far[i]) / 2, thresholds[i]
+
+def min_dcf(thresholds, frr, far, p_target=0.01, c_miss=1.0, c_fa=1.0):
+    """Minimum normalized detection cost and its threshold."""
+    cost = c_miss * p_target * frr + c_fa * (1 - p_target) * far
+    cost /= min(c_miss * p_target, c_fa * (1 - p_target))
+    i = np.argmin(cost)
+    return cost[i], thresholds[i]
+
+def threshold_at_far(thresholds, far, target):
+    """The lowest threshold whose false-accept rate is at most `target`."""
+    return thresholds[np.argmax(far <= target)]
+
+def det_points(frr, far, n_points=200):
+    """Up to n_points (far, frr) pairs spread along the DET curve."""
+    keep = np.unique(np.linspace(0, len(frr) - 1, n_points).astype(int))
+    return far[keep], frr[keep]
+
+def deployed_scores(verifier, utterances):
+    """Score raw utterances against every enrolled user through verify_speaker.
+    
+    Unlike score_matrix this applies the verifier's top-C selection and
+    cascade, one trial at a time; cascade rejects score -inf. Each utterance
+    is scaled with the claimed user's stats, as at verification time.
+    Returns (user_ids, scores) like score_matrix.
+    """
+    user_ids = [user_id for user_id in verifier.list_users() if verifier.get_stats(user_id) is not None]
+    scores = np.empty((len(utterances), len(user_ids)))
+    for j, user_id in enumerate(user_ids):
+        stats = verifier.get_stats(user_id)
+        for i, features in enumerate(utterances):
+            scores[i, j] = verifier.verify_speaker(user_id, stats.transform(features))[1]
+    return user_ids, scores
+
+def evaluate(data_dir, models_dir="models", score_norm='znorm', workers=None, cache_dir="feature_cache",
+             p_target=0.01, det_csv=None, save_scores=None, top_c=5, cascade=True):
+    """Score every labeled WAV against every enrolled model and report error rates.
+    
+    Trials whose speaker label equals the model's user ID are genuine, all
+    others are impostor trials. The defaults score as main.py verifies;
+    with top_c=None and cascade=False the faster batched full scoring is
+    used. Returns a dict of metrics and thresholds.
+    """
+    from voice_processor import VoiceProcessor
+    from feature_cache import FeatureCache
+    from speaker_verifier import SpeakerVerifier
+    
+    pairs = find_labeled_wavs(data_dir)
+    if not pairs:
+        print(f"No WAV files found in {data_dir}")
+        return None
+    paths, labels = zip(*pairs)
+    
+    start = time.perf_counter()
+    processor = VoiceProcessor(cache=FeatureCache(cache_dir) if cache_dir else None, dtype='float32')
+    utterances = processor.extract_features_many(paths, workers)
+    print(f"Features for {len(paths)} files in {time.perf_counter() - start:.1f} s")
+    
+    start = time.perf_counter()
+    verifier = SpeakerVerifier(use_ubm=True, top_c=top_c, score_norm=score_norm, cascade=cascade,
+                               models_dir=models_dir)
+    if top_c or cascade:
+        user_ids, scores = deployed_scores(verifier, utterances)
+    else:
+        user_ids, scores = verifier.score_matrix(utterances)
+    print(f"Scored {scores.size} trials ({len(paths)} x {len(user_ids)} models) "
+          f"in {time.perf_counter() - start:.1f} s")
+    print(f"Scoring as SpeakerVerifier(use_ubm=True, top_c={top_c}, score_norm={score_norm!r}, cascade={cascade})")
+    if cascade:
+        print(f"Cascade pre-filter rejected {verifier.cascade_stats()['prefilter_reject_rate']:.1%} of trials")
+    
+    target = np.asarray(labels)[:, None] == np.asarray(user_ids)[None, :]
+    genuine, impostor = scores[target], scores[~target]
+    if not len(genuine) or not len(impostor):
+        print("Need both genuine and impostor trials (label WAVs with enrolled user IDs).")
+        return None
+    if save_scores:
+        np.savez(save_scores, scores=scores, user_ids=np.asarray(user_ids), paths=np.asarray(paths),
+                 labels=np.asarray(labels))
+    
+    thresholds, frr, far = error_rates(genuine, impostor)
+    eer, eer_threshold = equal_error_rate(thresholds, frr, far)
+    dcf, dcf_threshold = min_dcf(thresholds, frr, far, p_target)
+    results = {
+        'genuine_trials': len(genuine),
+        'impostor_trials': len(impostor),
+        'eer': eer,
+        'eer_threshold': eer_threshold,
+        'min_dcf': dcf,
+        'min_dcf_threshold': dcf_threshold,
+        'far_thresholds': {target: threshold_at_far(thresholds, far, target) for target in (0.001, 0.01, 0.05)}
+    }
+    
+    setting = 'norm_threshold' if score_norm else 'llr_threshold' if verifier._uses_llr() else 'threshold'
+    print(f"\n=== Evaluation ({len(genuine)} genuine, {len(impostor)} impostor trials) ===")
+    print(f"EER:     {eer:.2%} at {eer_threshold:.3f}")
+    print(f"minDCF:  {dcf:.4f} (p_target={p_target}) at {dcf_threshold:.3f}")
+    for far_target, threshold in results['far_thresholds'].items():
+        i = np.searchsorted(thresholds, threshold)
+        print(f"FAR <= {far_target:.1%}: threshold {threshold:.3f} (FRR {frr[i]:.2%})")
+    print(f"Recommended SpeakerVerifier {setting}: {dcf_threshold:.3f} (minDCF)")
+    
+    if det_csv:
+        det_far, det_frr = det_points(frr, far)
+        np.savetxt(det_csv, np.column_stack([det_far, det_frr]), delimiter=",", header="far,frr", comments="")
+        print(f"DET points written to {det_csv}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute EER, minDCF and thresholds from labeled recordings.")
+    parser.add_argument("data_dir", help="WAVs in per-speaker subdirectories or named <speaker>_<n>.wav")
+    parser.add_argument("--models", default="models", help="models directory holding the bank")
+    parser.add_argument("--norm", choices=["none", "znorm", "tnorm"], default="znorm")
+    parser.add_argument("--top-c", type=int, default=5, help="top-C components per frame (0 for full scoring)")
+    parser.add_argument("--no-cascade", action="store_true", help="score every trial with the full model")
+    parser.add_argument("--workers", type=int, default=None, help="feature extraction processes")
+    parser.add_argument("--cache-dir", default="feature_cache", help="feature cache directory ('' to disable)")
+    parser.add_argument("--p-target", type=float, default=0.01, help="target prior for minDCF")
+    parser.add_argument("--det-csv", default=None, help="write DET curve points to this CSV")
+    parser.add_argument("--save-scores", default=None, help="save the score matrix to this .npz")
+    args = parser.parse_args()
+    
+    evaluate(args.data_dir, args.models, None if args.norm == "none" else args.norm, args.workers,
+             args.cache_dir or None, args.p_target, args.det_csv, args.save_scores, args.top_c or None,
+             not args.no_cascade)
+
+if __name__ == "__main__":
+    main()
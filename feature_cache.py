@@ -0,0 +1,120 @@
+import hashlib
+import numpy as np
+import os
+import threading
+from collections import OrderedDict
+
+class FeatureCache:
+    def __init__(self, cache_dir="feature_cache", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_stored = 0
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._lock = threading.Lock()
+        
+        # Create cache directory if it doesn't exist
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+            
+        self._scan()
+        
+    def _scan(self):
+        """Rebuild the LRU order from the entries already on disk."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+                
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.bytes_stored += size
+            
+        self._evict()
+    
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+    
+    def make_key(self, audio_bytes, params):
+        """Build a cache key from the raw audio bytes and extractor parameters."""
+        digest = hashlib.sha256(audio_bytes)
+        digest.update(repr(tuple(params)).encode())
+        return digest.hexdigest()
+    
+    def key_for_file(self, audio_path, params):
+        """Build a cache key for an audio file."""
+        with open(audio_path, 'rb') as f:
+            return self.make_key(f.read(), params)
+    
+    def get(self, key):
+        """Return cached features for a key, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            
+        path = self._path(key)
+        try:
+            features = np.load(path)
+            os.utime(path)  # Keep the LRU order across restarts
+        except OSError:
+            # Entry was removed behind our back
+            with self._lock:
+                self.bytes_stored -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        
+        return features
+    
+    def put(self, key, features):
+        """Store features under a key and evict old entries if over budget."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, features)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        
+        with self._lock:
+            self.bytes_stored += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+    
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget."""
+        while self.bytes_stored > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.bytes_stored -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+    
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            for key in self._entries:
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self.bytes_stored = 0
+    
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.bytes_stored
+            }
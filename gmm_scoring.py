@@ -0,0 +1,328 @@
+import numpy as np
+
+LOG_2PI = np.log(2 * np.pi)
+
+def logsumexp(a, axis=-1):
+    """Numerically stable log(sum(exp(a))) along an axis."""
+    peak = a.max(axis=axis, keepdims=True)
+    peak = np.where(np.isfinite(peak), peak, 0)
+    total = np.log(np.exp(a - peak).sum(axis=axis, keepdims=True)) + peak
+    return np.squeeze(total, axis=axis)
+
+class DiagGMMScorer:
+    """Log-likelihood scoring for diagonal-covariance GMMs.
+    
+    Everything that depends only on the model is computed once, so scoring
+    is two matrix multiplies plus a log-sum-exp:
+    
+        log w_k N(x | mu_k, P_k) = c_k + x . (P_k mu_k) - 0.5 x^2 . P_k
+    """
+    
+    def __init__(self, weights, means, precisions, chunk_size=None):
+        weights = np.asarray(weights, dtype=np.float64)
+        means = np.asarray(means, dtype=np.float64)
+        precisions = np.asarray(precisions, dtype=np.float64)
+        n_features = means.shape[1]
+        
+        self.weights = weights
+        self.means = means
+        self.precisions = precisions
+        self.chunk_size = chunk_size  # Frames per block, bounds the (frames, components) buffer
+        
+        self.log_norm = (
+            np.log(weights)
+            + 0.5 * (np.log(precisions).sum(axis=1) - n_features * LOG_2PI)
+            - 0.5 * (means ** 2 * precisions).sum(axis=1)
+        )
+        self.linear = (means * precisions).T  # (n_features, n_components)
+        self.quadratic = -0.5 * precisions.T  # (n_features, n_components)
+        self._cast = {}
+        
+    @classmethod
+    def from_gmm(cls, gmm, chunk_size=None):
+        """Build a scorer from a fitted sklearn GaussianMixture with covariance_type='diag'."""
+        if gmm.covariance_type != 'diag':
+            raise ValueError(f"Only diagonal GMMs are supported, got '{gmm.covariance_type}'")
+        return cls(gmm.weights_, gmm.means_, gmm.precisions_, chunk_size)
+    
+    @property
+    def n_components(self):
+        return len(self.weights)
+    
+    @property
+    def nbytes(self):
+        """Memory held by the parameters and precomputed terms.
+        
+        Includes the float32 copies of the terms made on the first float32
+        scoring, whether or not they exist yet, so the size a cache
+        accounts for at insert does not grow afterwards.
+        """
+        terms = [self.log_norm, self.linear, self.quadratic]
+        float32_terms = sum(term.size * np.dtype(np.float32).itemsize for term in terms)
+        return sum(array.nbytes for array in [self.weights, self.means, self.precisions] + terms) + float32_terms
+    
+    def _params(self, dtype):
+        """Model parameters in the feature dtype, so float32 features stay float32."""
+        if dtype == np.float64:
+            return self.log_norm, self.linear, self.quadratic
+        if dtype not in self._cast:
+            self._cast[dtype] = tuple(p.astype(dtype) for p in (self.log_norm, self.linear, self.quadratic))
+        return self._cast[dtype]
+    
+    def component_log_prob(self, X):
+        """Weighted per-component log densities, shape (n_frames, n_components)."""
+        X = np.asarray(X)
+        if X.dtype != np.float32:
+            X = X.astype(np.float64, copy=False)
+        log_norm, linear, quadratic = self._params(X.dtype)
+        
+        log_prob = X @ linear
+        log_prob += (X * X) @ quadratic
+        log_prob += log_norm
+        return log_prob
+    
+    def selected_log_prob(self, X, indices):
+        """Weighted log densities of only the selected components per frame.
+        
+        `indices` has shape (n_frames, C); the result has the same shape, and
+        costs O(n_frames * C * n_features) instead of a full evaluation.
+        """
+        X = np.asarray(X)
+        if X.dtype != np.float32:
+            X = X.astype(np.float64, copy=False)
+        log_norm, linear, quadratic = self._params(X.dtype)
+        
+        log_prob = np.einsum('td,tcd->tc', X, linear.T[indices])
+        log_prob += np.einsum('td,tcd->tc', X * X, quadratic.T[indices])
+        log_prob += log_norm[indices]
+        return log_prob
+    
+    def top_components(self, X, top_c):
+        """Per-frame log densities and indices of the top_c best-scoring components."""
+        log_prob = self.component_log_prob(X)
+        top_c = min(top_c, self.n_components)
+        indices = np.argpartition(-log_prob, top_c - 1, axis=1)[:, :top_c]
+        return log_prob, indices
+    
+    def predict_proba(self, X):
+        """Component responsibilities per frame, shape (n_frames, n_components)."""
+        log_prob = self.component_log_prob(X)
+        log_prob -= logsumexp(log_prob, axis=1)[:, None]
+        return np.exp(log_prob)
+    
+    def score_samples(self, X):
+        """Per-frame log-likelihood, shape (n_frames,)."""
+        if self.chunk_size is None or len(X) <= self.chunk_size:
+            return logsumexp(self.component_log_prob(X), axis=1)
+        
+        return np.concatenate([
+            logsumexp(self.component_log_prob(X[start:start + self.chunk_size]), axis=1)
+            for start in range(0, len(X), self.chunk_size)
+        ])
+    
+    def score(self, X):
+        """Average per-frame log-likelihood, matching GaussianMixture.score."""
+        return float(self.score_samples(X).mean())
+
+def quantize(values, dtype):
+    """Quantize a (n_components, n_features) array per feature dimension.
+    
+    'float16' is a plain cast. 'int8' maps each column's range onto
+    [-127, 127] with a float32 per-column scale and center. Returns
+    (codes, scale, center), with scale and center None for float16.
+    """
+    if dtype == 'float16':
+        return values.astype(np.float16), None, None
+    if dtype != 'int8':
+        raise ValueError(f"Unsupported quantization dtype: {dtype}")
+    high, low = values.max(axis=0), values.min(axis=0)
+    center = ((high + low) / 2).astype(np.float32)
+    scale = np.maximum((high - low) / 254, np.finfo(np.float32).tiny).astype(np.float32)
+    codes = np.clip(np.rint((values - center) / scale), -127, 127).astype(np.int8)
+    return codes, scale, center
+
+def dequantize(codes, scale, center):
+    """Inverse of quantize(), in float64."""
+    if scale is None:
+        return codes.astype(np.float64)
+    return codes * scale.astype(np.float64) + center
+
+class CompactGMM:
+    """A diagonal GMM held as weights plus quantized means and log-precisions.
+    
+    Only the parameters needed for scoring are kept, and the scoring terms
+    are rebuilt from them on each call (O(n_components * n_features), small
+    next to scoring the frames). MAP-adapted models can share the UBM's
+    precision array instead of storing their own. Exposes the DiagGMMScorer
+    scoring methods, so it can stand in for one.
+    """
+    
+    def __init__(self, weights, means, precisions, dtype='int8', shared_precisions=None):
+        self.dtype = dtype
+        self._weights = np.asarray(weights, dtype=np.float32)
+        self._means = quantize(np.asarray(means, dtype=np.float64), dtype)
+        self._shared_precisions = shared_precisions
+        self._log_precisions = None
+        if shared_precisions is None:
+            # Precisions span orders of magnitude, so their logs are quantized
+            self._log_precisions = quantize(np.log(np.asarray(precisions, dtype=np.float64)), dtype)
+    
+    @classmethod
+    def from_scorer(cls, scorer, dtype='int8', shared_precisions=None):
+        return cls(scorer.weights, scorer.means, scorer.precisions, dtype, shared_precisions)
+    
+    @property
+    def n_components(self):
+        return len(self._weights)
+    
+    @property
+    def weights(self):
+        return self._weights.astype(np.float64)
+    
+    @property
+    def means(self):
+        return dequantize(*self._means)
+    
+    @property
+    def precisions(self):
+        if self._shared_precisions is not None:
+            return self._shared_precisions
+        return np.exp(dequantize(*self._log_precisions))
+    
+    @property
+    def nbytes(self):
+        """Memory held by this model (a shared precision array is not counted)."""
+        arrays = [self._weights] + list(self._means)
+        if self._log_precisions is not None:
+            arrays += list(self._log_precisions)
+        return sum(array.nbytes for array in arrays if array is not None)
+    
+    def to_scorer(self):
+        """Dequantize into a DiagGMMScorer."""
+        return DiagGMMScorer(self.weights, self.means, self.precisions)
+    
+    def component_log_prob(self, X):
+        return self.to_scorer().component_log_prob(X)
+    
+    def selected_log_prob(self, X, indices):
+        return self.to_scorer().selected_log_prob(X, indices)
+    
+    def top_components(self, X, top_c):
+        return self.to_scorer().top_components(X, top_c)
+    
+    def predict_proba(self, X):
+        return self.to_scorer().predict_proba(X)
+    
+    def score_samples(self, X):
+        return self.to_scorer().score_samples(X)
+    
+    def score(self, X):
+        return self.to_scorer().score(X)
+
+class StackedGMMScorer:
+    """Scores one utterance against many diagonal GMMs in a single pass.
+    
+    All models' parameters live in contiguous (n_features, n_models *
+    n_components) arrays. Models fitted on per-model standardized features
+    can fold their normalization into the parameters: for x' = (x - m) / s
+    the density of x' equals the density of x under mean m + s * mu and
+    precision P / s^2, times prod(s). So raw features are scored once for
+    everyone and the result equals scoring each model on its own normalized
+    features.
+    """
+    
+    def __init__(self, weights, means, precisions, shifts=None, scales=None):
+        """Stack models from (n_models, n_components[, n_features]) arrays.
+        
+        `shifts` and `scales` (n_models, n_features) are each model's feature
+        normalization; omit them for models trained on raw features.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        means = np.asarray(means, dtype=np.float64)
+        precisions = np.asarray(precisions, dtype=np.float64)
+        n_models, n_components, n_features = means.shape
+        
+        self.offsets = np.zeros(n_models)
+        if shifts is not None:
+            scales = np.asarray(scales, dtype=np.float64)
+            means = shifts[:, None, :] + scales[:, None, :] * means
+            precisions = precisions / scales[:, None, :] ** 2
+            self.offsets = np.log(scales).sum(axis=1)
+        
+        # Zero-weight (padding) components get a log-normalizer of -inf
+        with np.errstate(divide='ignore'):
+            log_norm = (
+                np.log(weights)
+                + 0.5 * (np.log(precisions).sum(axis=2) - n_features * LOG_2PI)
+                - 0.5 * (means ** 2 * precisions).sum(axis=2)
+            )
+        
+        self.n_models = n_models
+        self.n_components = n_components
+        self.log_norm = log_norm.reshape(-1)
+        self.linear = (means * precisions).reshape(-1, n_features).T
+        self.quadratic = (-0.5 * precisions).reshape(-1, n_features).T
+        
+    @classmethod
+    def from_scorers(cls, scorers, normalizations=None):
+        """Stack DiagGMMScorers; `normalizations` holds (shift, scale) or None per model."""
+        n_models = len(scorers)
+        n_components = max(scorer.n_components for scorer in scorers)
+        n_features = scorers[0].means.shape[1]
+        
+        # Models with fewer components are padded with zero-weight components
+        weights = np.zeros((n_models, n_components))
+        means = np.zeros((n_models, n_components, n_features))
+        precisions = np.ones((n_models, n_components, n_features))
+        for i, scorer in enumerate(scorers):
+            k = scorer.n_components
+            weights[i, :k] = scorer.weights
+            means[i, :k] = scorer.means
+            precisions[i, :k] = scorer.precisions
+            
+        if not normalizations:
+            return cls(weights, means, precisions)
+        
+        shifts = np.zeros((n_models, n_features))
+        scales = np.ones((n_models, n_features))
+        for i, normalization in enumerate(normalizations):
+            if normalization is not None:
+                shifts[i], scales[i] = normalization
+        return cls(weights, means, precisions, shifts, scales)
+        
+    def score(self, X, chunk_size=256):
+        """Average per-frame log-likelihood of X under every model, shape (n_models,).
+        
+        Frames are processed in chunks of `chunk_size` to bound the
+        (frames, models * components) buffer.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        totals = np.zeros(self.n_models)
+        for start in range(0, len(X), chunk_size):
+            totals += self._block_scores(X[start:start + chunk_size]).sum(axis=0)
+        return totals / len(X) + self.offsets
+    
+    def score_batch(self, utterances, chunk_size=256):
+        """Average per-frame log-likelihood of each utterance under every model, shape (n_utterances, n_models).
+        
+        The frames of all utterances are scored together in chunks, so short
+        utterances still make full-sized matrix products.
+        """
+        lengths = np.array([len(features) for features in utterances])
+        owners = np.repeat(np.arange(len(utterances)), lengths)
+        X = np.concatenate(utterances).astype(np.float64, copy=False)
+        totals = np.zeros((len(utterances), self.n_models))
+        for start in range(0, len(X), chunk_size):
+            ids = owners[start:start + chunk_size]
+            # Frames are grouped by utterance, so each run of equal ids is one partial sum
+            bounds = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            totals[ids[bounds]] += np.add.reduceat(self._block_scores(X[start:start + chunk_size]), bounds, axis=0)
+        return totals / lengths[:, None] + self.offsets
+    
+    def _block_scores(self, block):
+        """Per-frame log-likelihood of a block of frames under every model, shape (frames, n_models)."""
+        log_prob = block @ self.linear
+        log_prob += (block * block) @ self.quadratic
+        log_prob += self.log_norm
+        log_prob = log_prob.reshape(len(block), self.n_models, self.n_components)
+        return logsumexp(log_prob, axis=2)
@@ -1,3 +1,4 @@
+import startup_timing
 import customtkinter as ctk
 from PIL import Image, ImageTk
 import os
@@ -11,6 +12,8 @@ import tkinter as tk
 import random
 import json  # For saving and loading data
 
+startup_timing.mark("gui imports done")
+
 class BankVaultGUI:
     def create_default_profile_image(self, size=100):
         """Create a default profile image with random color"""
@@ -37,6 +40,7 @@ class BankVaultGUI:
         # Configure the main window
         self.root = ctk.CTk()
         self.root.title("Voice Vault")  # Change project name
+        startup_timing.mark("main window created")
         
         # Set window close protocol
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -142,6 +146,14 @@ class BankVaultGUI:
         
         # Start hint rotation
         self.rotate_hints()
+        
+        # Load the voice stack once the first frame is on screen
+        self.root.after_idle(self._on_first_frame)
+    
+    def _on_first_frame(self):
+        """Record time-to-interactive and start preloading the voice stack."""
+        startup_timing.mark("login screen interactive")
+        self.system.start_preload(on_ready=startup_timing.print_report)
     
     def load_user_data(self):
         """Load user data from file"""
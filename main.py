@@ -1,17 +1,180 @@
+import json
 import os
+import threading
 import time
-from audio_recorder import AudioRecorder
-from voice_processor import VoiceProcessor
-from speaker_verifier import SpeakerVerifier
+import startup_timing
+
+def find_enrollment_recordings(recordings_dir="recordings"):
+    """Map each user ID to their enrollment WAV files (`<user>_enroll_<n>.wav`)."""
+    recordings = {}
+    for filename in sorted(os.listdir(recordings_dir)) if os.path.isdir(recordings_dir) else []:
+        if "_enroll_" in filename and filename.endswith(".wav"):
+            user_id = filename.rsplit("_enroll_", 1)[0]
+            recordings.setdefault(user_id, []).append(os.path.join(recordings_dir, filename))
+    return recordings
+
+def load_cohort_features(processor, recordings_dir="recordings"):
+    """Raw enrollment features per user, the impostor cohort for score normalization."""
+    return {
+        user_id: processor.extract_features_batch(files)
+        for user_id, files in find_enrollment_recordings(recordings_dir).items()
+    }
 
 class BankVaultSystem:
-    def __init__(self):
-        self.recorder = AudioRecorder(duration=3)
-        self.processor = VoiceProcessor()
-        self.verifier = SpeakerVerifier()
+    def __init__(self, save_recordings=False):
+        self.save_recordings = save_recordings  # Keep verification WAVs on disk
         self.passphrase = "Open my secure vault"
         self.passwords = {}  # Dictionary to store user passwords
         
+        # The audio and ML stacks are heavy to import, so the components that
+        # need them are created on first voice use or by preload()
+        self._recorder = None
+        self._processor = None
+        self._verifier = None
+        self._enrollment_queue = None
+        self._components_lock = threading.RLock()
+        self.voice_ready = threading.Event()
+        self.recent_users_path = os.path.join("models", "recent_users.json")  # Preload order
+        self._status_lock = threading.Lock()
+        self._preload_status = {'stage': 'idle', 'models_loaded': 0, 'models_total': 0, 'error': None}
+        
+    @property
+    def recorder(self):
+        with self._components_lock:
+            if self._recorder is None:
+                from audio_recorder import AudioRecorder
+                self._recorder = AudioRecorder(duration=3)
+            return self._recorder
+    
+    @property
+    def processor(self):
+        with self._components_lock:
+            if self._processor is None:
+                from voice_processor import VoiceProcessor
+                from feature_cache import FeatureCache
+                self._processor = VoiceProcessor(cache=FeatureCache(), dtype='float32')
+            return self._processor
+    
+    @property
+    def verifier(self):
+        with self._components_lock:
+            if self._verifier is None:
+                from speaker_verifier import SpeakerVerifier
+                self._verifier = SpeakerVerifier(use_ubm=True, top_c=5, score_norm='znorm', cascade=True)
+            return self._verifier
+    
+    @property
+    def enrollment_queue(self):
+        with self._components_lock:
+            if self._enrollment_queue is None:
+                from enrollment_queue import EnrollmentQueue
+                self._enrollment_queue = EnrollmentQueue(self.processor, self.verifier)
+            return self._enrollment_queue
+    
+    def submit_enrollment(self, user_id, samples, on_progress=None):
+        """Start training a user's voice model from WAV files in the background.
+        
+        Returns an EnrollmentJob right away; use job.wait() for the result,
+        job.cancel() to abort and `on_progress(job, stage, done, total)` or
+        job.progress to follow it.
+        """
+        return self.enrollment_queue.submit(user_id, samples, on_progress)
+    
+    def preload_status(self):
+        """Return a snapshot of preload progress: stage, models loaded/total and any error."""
+        with self._status_lock:
+            return dict(self._preload_status)
+    
+    def _set_status(self, **status):
+        with self._status_lock:
+            self._preload_status.update(status)
+    
+    def preload(self):
+        """Import the voice stack, load user models and warm up scoring ahead of first use."""
+        self._set_status(stage='imports')
+        for module_name in startup_timing.HEAVY_MODULES:
+            try:
+                startup_timing.timed_import(module_name)
+            except Exception as e:  # e.g. no PortAudio on this machine
+                print(f"Could not preload {module_name}: {e}")
+                
+        try:
+            self.processor
+            self.verifier
+            self.recorder
+            startup_timing.mark("voice stack ready")
+            
+            self._set_status(stage='models')
+            self.verifier.preload_models(
+                recent=self._load_recent_users(),
+                on_progress=lambda done, total: self._set_status(models_loaded=done, models_total=total)
+            )
+            startup_timing.mark("models preloaded")
+            
+            self._set_status(stage='warm-up')
+            self.warm_up()
+            startup_timing.mark("warm-up done")
+            self._set_status(stage='ready')
+        except Exception as e:
+            # Preloading is an optimization; the first verification loads what it needs
+            print(f"Voice preload incomplete: {e}")
+            self._set_status(stage='failed', error=str(e))
+        finally:
+            self.voice_ready.set()
+    
+    def warm_up(self):
+        """Run one dummy extraction and verification so first-call costs are paid now."""
+        import numpy as np
+        
+        # A second of a voiced-like tone over faint noise at the recording rate
+        sr = self.recorder.sample_rate
+        t = np.arange(sr) / sr
+        rng = np.random.default_rng(0)
+        y = (0.3 * np.sin(2 * np.pi * 150 * t) * (1 + np.sin(2 * np.pi * 3 * t)) +
+             0.01 * rng.standard_normal(sr)).astype(np.float32)
+        
+        users = self.verifier.models.keys()
+        if users:
+            user_id = users[-1]  # Most recently used (the most recent user after preload), so the LRU order is kept
+            stats = self.verifier.get_stats(user_id)
+            if stats is not None:
+                features = self.processor.process_verification_audio(y, sr, stats)
+                self.verifier.verify_speaker(user_id, features)
+                return
+        
+        # Nobody enrolled yet: warm the feature kernel and the background model
+        features = self.processor.extract_features_from_array(y, sr)
+        ubm = self.verifier.load_ubm()
+        if ubm is not None:
+            ubm.score(features)
+    
+    def _load_recent_users(self):
+        try:
+            with open(self.recent_users_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+    
+    def _remember_recent(self, user_id, limit=100):
+        """Move a user to the front of the recency list used to order preloading."""
+        recent = [user_id] + [uid for uid in self._load_recent_users() if uid != user_id]
+        try:
+            with open(self.recent_users_path, "w") as f:
+                json.dump(recent[:limit], f)
+        except OSError as e:
+            print(f"Could not update recent users: {e}")
+    
+    def start_preload(self, on_ready=None):
+        """Run preload() on a background daemon thread and return the thread."""
+        def run():
+            self.preload()
+            if on_ready is not None:
+                on_ready()
+                
+        thread = threading.Thread(target=run, name="voice-preload", daemon=True)
+        thread.start()
+        return thread
+        
     def enroll_user(self, user_id):
         """Enroll a new user by recording multiple samples of the passphrase and setting a password."""
         print(f"\n=== Enrolling User: {user_id} ===")
@@ -32,12 +195,62 @@ class BankVaultSystem:
             filepath = self.recorder.save_recording(filename)
             recordings.append(filepath)
             
-        # Process recordings and train model
-        features = self.processor.process_enrollment_samples(recordings)
-        self.verifier.train_model(user_id, features)
+        # Process recordings and train model in the background
+        def report(job, stage, done, total):
+            if stage == 'em':
+                print(f"\rTraining voice model: iteration {done}", end="", flush=True)
+            elif stage in ('extraction', 'map', 'saving') and done == 0:
+                print(f"\n{stage.capitalize()}...")
+        
+        job = self.submit_enrollment(user_id, recordings, on_progress=report)
+        try:
+            job.wait()
+        except Exception as e:
+            print(f"\nEnrollment of {user_id} failed: {e}")
+            return
         
+        self.update_score_normalization([user_id])
         print(f"\nUser {user_id} has been successfully enrolled!")
         
+    def train_background_model(self, recordings_dir="recordings"):
+        """Train the Universal Background Model from every user's enrollment recordings.
+        
+        The raw frames are pooled and normalized with statistics over all of
+        them, which are stored with the UBM; users adapted from it are
+        verified in that same feature space.
+        """
+        recordings = find_enrollment_recordings(recordings_dir)
+        if not recordings:
+            print("\nNo enrollment recordings found.")
+            return None
+        
+        # Streamed one user at a time (features come from the cache after the first pass)
+        ubm = self.verifier.train_ubm(
+            lambda: (features for files in recordings.values()
+                     for features in self.processor.extract_features_batch(files))
+        )
+        print(f"\nBackground model trained on {len(recordings)} users.")
+        self.update_score_normalization()
+        print("Users enrolled from now on are adapted from it; re-enroll existing users to benefit.")
+        return ubm
+    
+    def update_score_normalization(self, user_ids=None, recordings_dir="recordings"):
+        """Recompute Z-norm statistics against everyone's enrollment recordings as the impostor cohort."""
+        cohort = load_cohort_features(self.processor, recordings_dir)
+        return self.verifier.compute_znorm(cohort, user_ids)
+    
+    def start_score_normalization(self, user_ids=None):
+        """Run update_score_normalization() on a background daemon thread and return the thread."""
+        def run():
+            try:
+                self.update_score_normalization(user_ids)
+            except Exception as e:
+                print(f"Score normalization update failed: {e}")
+                
+        thread = threading.Thread(target=run, name="znorm-refresh", daemon=True)
+        thread.start()
+        return thread
+    
     def verify_user(self, user_id):
         """Verify a user's identity using either voice or password."""
         print(f"\n=== Verifying User: {user_id} ===")
@@ -56,20 +269,36 @@ class BankVaultSystem:
             
     def _verify_voice(self, user_id):
         """Verify user using voice."""
+        # Recordings are scaled with the user's own enrollment statistics
+        stats = self.verifier.get_stats(user_id)
+        if stats is None:
+            print("\n❌ No voice normalization data stored for this user; please re-enroll.")
+            return
+        
         print(f"\nPlease say the passphrase: '{self.passphrase}'")
         
         input("Press Enter to start recording...")
-        self.recorder.record_audio()
-        filename = f"{user_id}_verify.wav"
-        filepath = self.recorder.save_recording(filename)
+        recording = self.recorder.record_audio()
+        if self.save_recordings:
+            self.recorder.save_recording_async(f"{user_id}_verify.wav")
         
-        # Process recording and verify
-        features = self.processor.process_verification_sample(filepath)
-        is_verified, score = self.verifier.verify_speaker(user_id, features)
+        # Process recording straight from memory and verify
+        features = self.processor.process_verification_audio(recording, self.recorder.sample_rate, stats)
+        is_verified, score, frames_used = self.verifier.verify_sequential(user_id, features)
+        print(f"Speech frames kept: {self.processor.last_vad_ratio:.0%}")
+        print(f"Decision after {frames_used} of {len(features)} frames")
+        self._remember_recent(user_id)
         
         if is_verified:
             print("\n✅ Voice Verification Successful!")
             print(f"Verification Score: {score:.2f}")
+            # Confident verifications also refine the user's model
+            version = self.verifier.adapt_model(user_id, features, score)
+            if version is not None:
+                print(f"Voice model updated (version {version})")
+                # The old Z-norm statistics do not apply to the updated model; until the new ones
+                # are ready the user is scored against the raw threshold
+                self.start_score_normalization([user_id])
             self._simulate_vault_opening()
         else:
             print("\n❌ Voice Verification Failed!")
@@ -123,9 +352,10 @@ def main():
         print("2. Verify User")
         print("3. List Enrolled Users")
         print("4. Delete User")
-        print("5. Exit")
+        print("5. Train Background Model")
+        print("6. Exit")
         
-        choice = input("\nEnter your choice (1-5): ")
+        choice = input("\nEnter your choice (1-6): ")
         
         if choice == "1":
             user_id = input("Enter user ID: ")
@@ -143,6 +373,9 @@ def main():
             system.delete_user(user_id)
             
         elif choice == "5":
+            system.train_background_model()
+            
+        elif choice == "6":
             print("\nThank you for using the Voice/Password-Activated Bank Vault System!")
             break
             
@@ -0,0 +1,171 @@
+import numpy as np
+import scipy.fft
+from functools import lru_cache
+
+# Defaults of librosa.feature.mfcc / librosa.feature.delta that the kernel reproduces
+N_MELS = 128
+DELTA_WIDTH = 9
+TOP_DB = 80.0
+AMIN = 1e-10
+
+def hz_to_mel(freqs):
+    """Convert Hz to mels (Slaney scale, as used by librosa)."""
+    freqs = np.asanyarray(freqs, dtype=np.float64)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    
+    mels = freqs / f_sp
+    log_region = freqs >= min_log_hz
+    mels = np.where(log_region, min_log_mel + np.log(np.maximum(freqs, min_log_hz) / min_log_hz) / logstep, mels)
+    return mels
+
+def mel_to_hz(mels):
+    """Convert mels (Slaney scale) back to Hz."""
+    mels = np.asanyarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    
+    freqs = f_sp * mels
+    log_region = mels >= min_log_mel
+    freqs = np.where(log_region, min_log_hz * np.exp(logstep * (mels - min_log_mel)), freqs)
+    return freqs
+
+def mel_filterbank(sr, n_fft, n_mels=N_MELS):
+    """Slaney-normalized triangular mel filterbank of shape (n_mels, 1 + n_fft // 2)."""
+    fft_freqs = np.linspace(0, sr / 2, 1 + n_fft // 2)
+    mel_freqs = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sr / 2), n_mels + 2))
+    
+    fdiff = np.diff(mel_freqs)
+    ramps = mel_freqs[:, None] - fft_freqs[None, :]
+    lower = -ramps[:-2] / fdiff[:-1, None]
+    upper = ramps[2:] / fdiff[1:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    
+    # Scale each filter to constant energy per band
+    enorm = 2.0 / (mel_freqs[2:n_mels + 2] - mel_freqs[:n_mels])
+    return weights * enorm[:, None]
+
+def dct_matrix(n_mfcc, n_mels=N_MELS):
+    """Orthonormal DCT-II basis of shape (n_mfcc, n_mels)."""
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, None]
+    basis = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+def hann_window(n_fft):
+    """Periodic Hann window, as used for spectral analysis."""
+    return 0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n_fft) / n_fft)
+
+def delta_matrix(order, width=DELTA_WIDTH):
+    """Savitzky-Golay derivative weights for every position in a window.
+    
+    Row `width // 2` is the interior regression kernel; the rows before and
+    after it evaluate the edge polynomial fit the way scipy's `mode='interp'`
+    does for the first and last `width // 2` frames.
+    """
+    positions = np.arange(width, dtype=np.float64)
+    powers = np.arange(order + 1)
+    vandermonde = positions[:, None] ** powers
+    
+    # d^order/dt^order of t^p is p! / (p - order)! * t^(p - order)
+    falling = np.array([np.prod(np.arange(p - order + 1, p + 1)) if p >= order else 0.0 for p in powers])
+    derivative = falling * positions[:, None] ** np.maximum(powers - order, 0)
+    return derivative @ np.linalg.pinv(vandermonde)
+
+class MFCCKernel:
+    def __init__(self, sr, n_fft, n_mfcc, hop_length, dtype='float64'):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.n_mfcc = n_mfcc
+        self.hop_length = hop_length
+        self.dtype = np.dtype(dtype)
+        
+        # Everything that does not depend on the signal is built once
+        self.window = hann_window(n_fft).astype(self.dtype)
+        self.mel_basis = mel_filterbank(sr, n_fft).T.astype(self.dtype)  # (n_bins, n_mels)
+        self.dct_basis = dct_matrix(n_mfcc).T.astype(self.dtype)  # (n_mels, n_mfcc)
+        self.delta_kernels = [delta_matrix(1).astype(self.dtype), delta_matrix(2).astype(self.dtype)]
+        
+    def n_frames(self, n_samples):
+        """Number of centered frames for a signal of n_samples."""
+        return 1 + n_samples // self.hop_length
+    
+    def power_spectrum(self, batch):
+        """Centered, zero-padded Hann-window power spectrum of shape (B, frames, bins).
+        
+        Zero padding matches librosa 0.10+ (pad_mode='constant'); older
+        releases reflect-padded, which changes the first and last frames.
+        """
+        pad = self.n_fft // 2
+        padded = np.pad(np.asarray(batch, dtype=self.dtype), ((0, 0), (pad, pad)), mode='constant')
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft, axis=-1)
+        frames = frames[:, ::self.hop_length]
+        
+        # scipy.fft keeps float32 input in single precision
+        spectrum = scipy.fft.rfft(frames * self.window, axis=-1)
+        power = np.square(spectrum.real)
+        power += np.square(spectrum.imag)
+        return power
+    
+    def mfcc(self, power, out=None):
+        """MFCCs of shape (B, frames, n_mfcc) from a batched power spectrum."""
+        log_mel = power @ self.mel_basis
+        np.maximum(log_mel, AMIN, out=log_mel)
+        np.log10(log_mel, out=log_mel)
+        log_mel *= 10.0
+        
+        # Clip each recording to TOP_DB below its own peak
+        peak = log_mel.max(axis=(1, 2), keepdims=True)
+        np.maximum(log_mel, peak - TOP_DB, out=log_mel)
+        return np.matmul(log_mel, self.dct_basis, out=out)
+    
+    def delta(self, mfccs, order, out=None):
+        """Delta features along the frame axis, matching librosa.feature.delta."""
+        weights = self.delta_kernels[order - 1]
+        width = weights.shape[0]
+        half = width // 2
+        if mfccs.shape[1] < width:
+            raise ValueError(f"Need at least {width} frames to compute deltas, got {mfccs.shape[1]}")
+        
+        if out is None:
+            out = np.empty_like(mfccs)
+        windows = np.lib.stride_tricks.sliding_window_view(mfccs, width, axis=1)
+        out[:, half:-half] = windows @ weights[half]
+        out[:, :half] = np.einsum('ij,bjc->bic', weights[:half], mfccs[:, :width])
+        out[:, -half:] = np.einsum('ij,bjc->bic', weights[half + 1:], mfccs[:, -width:])
+        return out
+    
+    def features(self, batch, return_energy=False, out=None):
+        """MFCC, delta and delta-delta features of shape (B, frames, 3 * n_mfcc).
+        
+        Each block is written straight into its columns of `out` (allocated
+        when not given), so no stacking copy is made. With `return_energy`,
+        also returns the per-frame log energy in dB, shape (B, frames), for
+        voice activity detection.
+        """
+        power = self.power_spectrum(batch)
+        n = self.n_mfcc
+        if out is None:
+            out = np.empty(power.shape[:2] + (3 * n,), dtype=self.dtype)
+            
+        mfccs = self.mfcc(power, out=out[..., :n])
+        self.delta(mfccs, 1, out=out[..., n:2 * n])
+        self.delta(mfccs, 2, out=out[..., 2 * n:])
+        features = out
+        if return_energy:
+            energy_db = 10.0 * np.log10(np.maximum(power.sum(axis=-1), AMIN))
+            return features, energy_db
+        return features
+
+def get_kernel(sr, n_fft, n_mfcc, hop_length, dtype='float64'):
+    """Return the shared kernel for a configuration, building it on first use."""
+    return _get_kernel(sr, n_fft, n_mfcc, hop_length, np.dtype(dtype).name)
+
+@lru_cache(maxsize=None)
+def _get_kernel(sr, n_fft, n_mfcc, hop_length, dtype):
+    return MFCCKernel(sr, n_fft, n_mfcc, hop_length, dtype)
@@ -0,0 +1,316 @@
+import json
+import numpy as np
+import os
+import threading
+import time
+
+# Per-row arrays stored in the bank, with their shape after the row axis
+_ARRAYS = {
+    'weights': lambda k, d: (k,),
+    'means': lambda k, d: (k, d),
+    'precisions': lambda k, d: (k, d),
+    'stats_mean': lambda k, d: (d,),
+    'stats_m2': lambda k, d: (d,),
+    # MAP sufficient statistics (soft counts and first-order sums) for online adaptation
+    'counts': lambda k, d: (k,),
+    'first_order': lambda k, d: (k, d),
+}
+
+class ModelBank:
+    """All users' diagonal GMMs in one pickle-free, memory-mapped store.
+    
+    Each parameter lives in its own .npy file of shape (capacity, ...), one
+    row per user, and index.json maps user_id to row plus per-user metadata.
+    Reading a user touches only that user's pages. Appends reuse freed rows
+    or grow capacity geometrically; deletes just free the row, and the files
+    are compacted (to twice the live rows) once more than `compact_ratio`
+    of the rows handed out so far have been freed. Index changes are
+    appended to index.journal and folded into index.json once the journal
+    outgrows the index, so a put costs O(1) index I/O.
+    """
+    
+    def __init__(self, bank_dir="models/bank", compact_ratio=0.5, initial_capacity=64):
+        self.bank_dir = bank_dir
+        self.compact_ratio = compact_ratio
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._arrays = None
+        self._journal_len = 0  # Entries in index.journal not yet folded into index.json
+        
+        # Create bank directory if it doesn't exist
+        if not os.path.exists(self.bank_dir):
+            os.makedirs(self.bank_dir)
+            
+        index_path = os.path.join(self.bank_dir, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as f:
+                self.index = json.load(f)
+        else:
+            self.index = {'n_components': None, 'n_features': None, 'capacity': 0, 'rows': {}, 'free': [],
+                          'next_row': 0, 'seq': 0, 'meta': {}}
+        
+        if 'next_row' not in self.index:
+            # Written when 'free' also listed never-used rows: keep only the freed ones below the last used row
+            next_row = max(self.index['rows'].values(), default=-1) + 1
+            self.index['free'] = [row for row in self.index['free'] if row < next_row]
+            self.index['next_row'] = next_row
+            self.index['seq'] = 0
+        self._replay_journal()
+    
+    def _path(self, name):
+        return os.path.join(self.bank_dir, f"{name}.npy")
+    
+    def _journal_path(self):
+        return os.path.join(self.bank_dir, "index.journal")
+    
+    def _write_index(self):
+        """Write the whole index and start an empty journal."""
+        index_path = os.path.join(self.bank_dir, "index.json")
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, index_path)
+        
+        # Entries already in index.json are skipped by sequence number if this is interrupted
+        if os.path.exists(self._journal_path()):
+            os.remove(self._journal_path())
+        self._journal_len = 0
+    
+    def _replay_journal(self):
+        """Apply journal entries newer than index.json."""
+        if not os.path.exists(self._journal_path()):
+            return
+        torn = False
+        with open(self._journal_path(), 'r') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    # The last append was cut short; its put never completed
+                    torn = True
+                    break
+                entry = json.loads(line)
+                if entry['seq'] > self.index['seq']:
+                    self._apply(entry)
+                self._journal_len += 1
+        if torn:
+            self._write_index()
+    
+    def _apply(self, entry):
+        """Apply one journal entry to the in-memory index."""
+        index = self.index
+        user_id = entry['user_id']
+        if entry['op'] == 'set':
+            row = entry['row']
+            if row in index['free']:
+                index['free'].remove(row)
+            index['next_row'] = max(index['next_row'], row + 1)
+            index['rows'][user_id] = row
+            index['meta'][user_id] = entry['meta']
+        elif user_id in index['rows']:  # 'delete'
+            index['free'].append(index['rows'].pop(user_id))
+            index['meta'].pop(user_id, None)
+        index['seq'] = entry['seq']
+    
+    def _log(self, op, user_id, **fields):
+        """Apply an index change and persist it, appending to the journal or folding it into index.json."""
+        entry = {'op': op, 'user_id': user_id, 'seq': self.index['seq'] + 1, **fields}
+        self._apply(entry)
+        if self._journal_len >= max(64, len(self.index['rows'])):
+            self._write_index()
+            return
+        with open(self._journal_path(), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self._journal_len += 1
+    
+    def _open(self):
+        """Memory-map the row arrays (read/write) if the bank has any."""
+        if self._arrays is None and self.index['capacity']:
+            k, d = self.index['n_components'], self.index['n_features']
+            for name, shape in _ARRAYS.items():
+                if not os.path.exists(self._path(name)):  # Array added after this bank was created
+                    np.lib.format.open_memmap(
+                        self._path(name), mode='w+', dtype=np.float64, shape=(self.index['capacity'],) + shape(k, d)
+                    ).flush()
+            self._arrays = {name: np.load(self._path(name), mmap_mode='r+') for name in _ARRAYS}
+        return self._arrays
+    
+    def _close(self):
+        if self._arrays is not None:
+            for array in self._arrays.values():
+                array.flush()
+            self._arrays = None
+    
+    def close(self):
+        """Release the memory maps (they are reopened on next access)."""
+        with self._lock:
+            self._close()
+    
+    def _rewrite(self, capacity, rows):
+        """Rewrite every array with a new capacity, moving `rows` (old row -> new row)."""
+        k, d = self.index['n_components'], self.index['n_features']
+        old = self._open()
+        for name, shape in _ARRAYS.items():
+            tmp_path = self._path(name) + ".tmp"
+            new = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(capacity,) + shape(k, d))
+            for old_row, new_row in rows.items():
+                new[new_row] = old[name][old_row]
+            new.flush()
+            del new
+        
+        # Release our maps before replacing the files (required on Windows)
+        old = None
+        self._close()
+        for name in _ARRAYS:
+            os.replace(self._path(name) + ".tmp", self._path(name))
+        self.index['capacity'] = capacity
+    
+    def _allocate_row(self):
+        """A freed row if there is one, else the next never-used row (growing the files if needed)."""
+        if self.index['free']:
+            return self.index['free'].pop()
+        
+        capacity = self.index['capacity']
+        if self.index['next_row'] >= capacity:
+            rows = {row: row for row in self.index['rows'].values()}
+            self._rewrite(max(self.initial_capacity, 2 * capacity), rows)
+            self._write_index()
+        return self.index['next_row']
+    
+    def put(self, user_id, weights, means, precisions, stats=None, adaptation=None, **meta):
+        """Store or replace a user's model in place.
+        
+        `stats` are the normalization statistics and `adaptation` the MAP
+        (counts, first_order) sufficient statistics; either is zeroed when
+        not given.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        means = np.asarray(means, dtype=np.float64)
+        k, d = means.shape
+        
+        with self._lock:
+            if self.index['n_components'] is None:
+                self.index['n_components'], self.index['n_features'] = k, d
+            elif (k, d) != (self.index['n_components'], self.index['n_features']):
+                raise ValueError(
+                    f"Bank holds {self.index['n_components']}x{self.index['n_features']} models, "
+                    f"got {k}x{d}"
+                )
+            
+            row = self.index['rows'].get(user_id)
+            if row is None:
+                row = self._allocate_row()
+            
+            arrays = self._open()
+            arrays['weights'][row] = weights
+            arrays['means'][row] = means
+            arrays['precisions'][row] = precisions
+            # Rows are reused, so clear stats left by a previous user
+            arrays['stats_mean'][row] = 0 if stats is None else stats.mean
+            arrays['stats_m2'][row] = 0 if stats is None else stats.m2
+            arrays['counts'][row] = 0 if adaptation is None else adaptation[0]
+            arrays['first_order'][row] = 0 if adaptation is None else adaptation[1]
+            for array in arrays.values():
+                array.flush()
+            
+            meta['updated_at'] = time.time()
+            if stats is not None:
+                meta['stats_count'] = int(stats.count)
+            self._log('set', user_id, row=row, meta={**self.index['meta'].get(user_id, {}), **meta})
+    
+    def get(self, user_id):
+        """Return (weights, means, precisions) for a user, or None if not stored."""
+        with self._lock:
+            row = self.index['rows'].get(user_id)
+            if row is None:
+                return None
+            arrays = self._open()
+            return (np.array(arrays['weights'][row]), np.array(arrays['means'][row]),
+                    np.array(arrays['precisions'][row]))
+    
+    def get_stats(self, user_id):
+        """Return (count, mean, m2) normalization statistics for a user, or None."""
+        with self._lock:
+            row = self.index['rows'].get(user_id)
+            count = self.index['meta'].get(user_id, {}).get('stats_count')
+            if row is None or count is None:
+                return None
+            arrays = self._open()
+            return count, np.array(arrays['stats_mean'][row]), np.array(arrays['stats_m2'][row])
+    
+    def get_adaptation(self, user_id):
+        """Return (counts, first_order) MAP statistics for a user, or None if none were stored."""
+        with self._lock:
+            row = self.index['rows'].get(user_id)
+            if row is None:
+                return None
+            arrays = self._open()
+            counts = np.array(arrays['counts'][row])
+            if not counts.any():
+                return None
+            return counts, np.array(arrays['first_order'][row])
+    
+    def get_meta(self, user_id):
+        """Return a copy of a user's metadata."""
+        with self._lock:
+            return dict(self.index['meta'].get(user_id, {}))
+    
+    def update_meta(self, user_id, **meta):
+        """Merge metadata fields for a stored user."""
+        with self._lock:
+            if user_id not in self.index['rows']:
+                raise KeyError(user_id)
+            self._log('set', user_id, row=self.index['rows'][user_id], meta={**self.index['meta'][user_id], **meta})
+    
+    def delete(self, user_id):
+        """Free a user's row; compacts the files when enough rows are free."""
+        with self._lock:
+            row = self.index['rows'].get(user_id)
+            if row is None:
+                return False
+            self._open()['weights'][row] = 0
+            self._log('delete', user_id)
+            
+            if len(self.index['free']) > self.compact_ratio * self.index['next_row']:
+                self.compact()
+            return True
+    
+    def compact(self):
+        """Rewrite the arrays so live users occupy rows 0..n-1, leaving room for as many again."""
+        with self._lock:
+            user_ids = sorted(self.index['rows'], key=self.index['rows'].get)
+            moves = {self.index['rows'][user_id]: new_row for new_row, user_id in enumerate(user_ids)}
+            self._rewrite(max(self.initial_capacity, 2 * len(user_ids)), moves)
+            self.index['rows'] = {user_id: new_row for new_row, user_id in enumerate(user_ids)}
+            self.index['free'] = []
+            self.index['next_row'] = len(user_ids)
+            self._write_index()
+    
+    def user_ids(self):
+        """All stored user IDs (an index read, no model data is touched)."""
+        with self._lock:
+            return list(self.index['rows'])
+    
+    def __contains__(self, user_id):
+        return user_id in self.index['rows']
+    
+    def __len__(self):
+        return len(self.index['rows'])
+    
+    def all_rows(self, names=None):
+        """Every stored user's parameters and stats as contiguous arrays, in user_ids order.
+        
+        `names` limits which arrays are gathered (default: all).
+        """
+        with self._lock:
+            user_ids = self.user_ids()
+            result = {'user_ids': user_ids}
+            if not user_ids:
+                return result
+            
+            rows = np.array([self.index['rows'][user_id] for user_id in user_ids])
+            arrays = self._open()
+            for name in names or _ARRAYS:
+                result[name] = arrays[name][rows]
+            result['stats_count'] = np.array([
+                self.index['meta'][user_id].get('stats_count', 0) for user_id in user_ids
+            ], dtype=np.float64)
+            return result
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+
+class ModelCache:
+    """Bounded LRU cache of loaded models with pinning and memory accounting.
+    
+    Limits are an entry count and/or a byte budget (from each value's
+    `nbytes`). Pinned entries are never evicted. Counters for hits, misses,
+    evictions and resident bytes can be read at any time with stats().
+    """
+    
+    def __init__(self, max_entries=None, max_bytes=None, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict  # Called with the key of every evicted entry
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_resident = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes), least recently used first
+        self._pinned = set()
+        self._lock = threading.RLock()
+        
+    def get(self, key, default=None):
+        """Return a cached value and mark it recently used, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, value):
+        """Insert or replace a value, then evict until within budget."""
+        nbytes = getattr(value, 'nbytes', 0)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes_resident -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes_resident += nbytes
+            self._evict()
+    
+    __setitem__ = put
+    
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def __contains__(self, key):
+        return key in self._entries
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def touch(self, key):
+        """Mark a key most recently used without counting a hit; False if absent."""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._entries.move_to_end(key)
+            return True
+    
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+    
+    def pop(self, key, default=None):
+        """Remove an entry (pinned or not) without counting it as an eviction."""
+        with self._lock:
+            self._pinned.discard(key)
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.bytes_resident -= entry[1]
+            return entry[0]
+    
+    def __delitem__(self, key):
+        if key not in self._entries:
+            raise KeyError(key)
+        self.pop(key)
+    
+    def pin(self, key):
+        """Keep a key resident regardless of the budget (it may be inserted later)."""
+        with self._lock:
+            self._pinned.add(key)
+    
+    def unpin(self, key):
+        with self._lock:
+            self._pinned.discard(key)
+            self._evict()
+    
+    def _over_budget(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.bytes_resident > self.max_bytes
+    
+    def _evict(self):
+        """Drop least recently used unpinned entries until within budget."""
+        if not self._over_budget():
+            return
+        for key in list(self._entries):
+            if not self._over_budget():
+                break
+            if key in self._pinned:
+                continue
+            _, nbytes = self._entries.pop(key)
+            self.bytes_resident -= nbytes
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes_resident = 0
+    
+    def stats(self):
+        """Return cache counters and current residency."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'pinned': len(self._pinned & set(self._entries)),
+                'bytes_resident': self.bytes_resident,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from main import find_enrollment_recordings, load_cohort_features
+
+# Per-process components, created once by _init_worker
+_worker = {}
+
+def _init_worker(config):
+    from voice_processor import VoiceProcessor
+    from feature_cache import FeatureCache
+    from speaker_verifier import SpeakerVerifier
+    
+    cache = FeatureCache(config['cache_dir']) if config['cache_dir'] else None
+    _worker['processor'] = VoiceProcessor(n_mfcc=config['n_mfcc'], cache=cache, dtype=config['dtype'])
+    _worker['verifier'] = SpeakerVerifier(
+        n_components=config['n_components'],
+        use_ubm=config['use_ubm'],
+        models_dir=config['staging_dir'],
+        cascade=config['cascade']
+    )
+
+def _enrollment_features(files):
+    """A user's raw enrollment features, one matrix per file (for UBM training).
+    
+    None if the recordings cannot be read; the user's own training then reports the error.
+    """
+    try:
+        return _worker['processor'].extract_features_batch(files)
+    except Exception:
+        return None
+
+def _train_user(user_id, files):
+    """Extract a user's enrollment features and fit their model (and pre-filter); nothing is written here."""
+    verifier = _worker['verifier']
+    features, stats, lengths = _worker['processor'].process_enrollment_samples(
+        files, return_stats=True, return_lengths=True)
+    features, stats = verifier._ubm_space(features, stats)
+    model, method, adaptation = verifier.fit_model(features)
+    prefilter = None
+    if verifier.cascade:
+        prefilter_model, reject_below = verifier.fit_prefilter(features, lengths)
+        prefilter = prefilter_model.weights, prefilter_model.means, prefilter_model.precisions, reject_below
+    return user_id, model.weights, model.means, model.precisions, stats, adaptation, method, prefilter
+
+def _start_staging(staging_dir, config, restart):
+    """Reuse a staging area left by an interrupted run with the same config, or start a new one."""
+    journal_path = os.path.join(staging_dir, "retrain.json")
+    if os.path.exists(journal_path) and not restart:
+        with open(journal_path) as f:
+            if json.load(f) == config:
+                return True
+        print("Previous retraining used a different configuration; starting over.")
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    os.makedirs(staging_dir)
+    with open(journal_path, "w") as f:
+        json.dump(config, f)
+    return False
+
+def _carry_over(live, staging, user_ids):
+    """Copy models of users without enrollment recordings into the staging bank.
+    
+    Returns the users whose model shape no longer fits the staging bank.
+    """
+    from voice_processor import RunningStats
+    
+    incompatible = []
+    for user_id in user_ids:
+        if user_id in staging.bank:
+            continue
+        model = live.load_model(user_id)
+        if model is None:
+            continue
+        index = staging.bank.index
+        if index['n_components'] is not None and model.means.shape != (index['n_components'], index['n_features']):
+            incompatible.append(user_id)
+            continue
+        stats = None
+        stored = live.bank.get_stats(user_id)
+        if stored is not None:
+            stats = RunningStats()
+            stats.count, stats.mean, stats.m2 = stored
+        meta = live.bank.get_meta(user_id)
+        staging.bank.put(user_id, model.weights, model.means, model.precisions, stats,
+                         live.bank.get_adaptation(user_id), method=meta.get('method', 'carried'),
+                         version=meta.get('version', 1))
+    return incompatible
+
+def _install(models_dir, staging, use_ubm):
+    """Swap the staged bank (and UBMs) in for the live one, keeping the old bank as bank.previous.
+    
+    The live pre-filter bank and small UBM are replaced by the staged ones,
+    or removed when retraining ran without the cascade, since pre-filters
+    of the old models must not gate the new ones.
+    """
+    live_bank = os.path.join(models_dir, "bank")
+    previous = os.path.join(models_dir, "bank.previous")
+    staging.bank.close()
+    
+    if os.path.exists(previous):
+        shutil.rmtree(previous)
+    if os.path.exists(live_bank):
+        os.replace(live_bank, previous)
+    os.replace(staging.bank.bank_dir, live_bank)
+    if use_ubm and staging.ubm is not None:
+        os.replace(os.path.join(staging.models_dir, "ubm.npz"), os.path.join(models_dir, "ubm.npz"))
+        
+    live_prefilter = os.path.join(models_dir, "prefilter")
+    if os.path.exists(live_prefilter):
+        shutil.rmtree(live_prefilter)
+    if staging.prefilter_bank is not None:
+        staging.prefilter_bank.close()
+        os.replace(staging.prefilter_bank.bank_dir, live_prefilter)
+    small_ubm = os.path.join(models_dir, "ubm_prefilter.npz")
+    staged_small_ubm = os.path.join(staging.models_dir, "ubm_prefilter.npz")
+    if os.path.exists(staged_small_ubm):
+        os.replace(staged_small_ubm, small_ubm)
+    elif os.path.exists(small_ubm):
+        os.remove(small_ubm)
+    shutil.rmtree(staging.models_dir)
+
+def retrain(recordings_dir="recordings", models_dir="models", workers=None, n_components=16, n_mfcc=13,
+            use_ubm=True, dtype="float32", cache_dir="feature_cache", restart=False, drop_missing=False,
+            cascade=True):
+    """Retrain every enrolled user from their enrollment recordings in a process pool.
+    
+    Models are written to a staging bank under `models_dir`/retrain as they
+    finish, so an interrupted run resumes where it stopped. The staged bank
+    replaces the live one only once every user has been retrained. Users
+    without recordings keep their current model if it still fits; otherwise
+    the install is refused unless `drop_missing` is set. With `cascade`,
+    the small background model and every retrained user's pre-filter are
+    refitted and installed with the bank; carried-over users get no
+    pre-filter and are always scored by their full model. Returns the
+    number of users trained in this run.
+    """
+    from voice_processor import FEATURE_VERSION
+    from speaker_verifier import SpeakerVerifier
+    
+    staging_dir = os.path.join(models_dir, "retrain")
+    config = {
+        'n_components': n_components,
+        'n_mfcc': n_mfcc,
+        'use_ubm': use_ubm,
+        'cascade': cascade,
+        'dtype': dtype,
+        'feature_version': FEATURE_VERSION,
+        'staging_dir': staging_dir,
+        'cache_dir': cache_dir
+    }
+    if _start_staging(staging_dir, config, restart):
+        print(f"Resuming retraining from {staging_dir}")
+        
+    live = SpeakerVerifier(models_dir=models_dir)
+    staging = SpeakerVerifier(n_components=n_components, use_ubm=use_ubm, models_dir=staging_dir, cascade=cascade)
+    users = live.list_users()
+    recordings = find_enrollment_recordings(recordings_dir)
+    missing = [user_id for user_id in users if user_id not in recordings]
+    todo = [user_id for user_id in users if user_id in recordings and user_id not in staging.bank]
+    print(f"{len(users)} enrolled users: {len(users) - len(missing) - len(todo)} already retrained, "
+          f"{len(todo)} to train, {len(missing)} without recordings")
+    
+    trained = 0
+    failed = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+        if use_ubm and (staging.load_ubm() is None or cascade and staging.load_prefilter_ubm() is None):
+            with_recordings = [user_id for user_id in users if user_id in recordings]
+            per_user = [files for files in pool.map(_enrollment_features,
+                                                    [recordings[u] for u in with_recordings])
+                        if files is not None]
+            if per_user:
+                staging.train_ubm([features for files in per_user for features in files])
+                print(f"Background model trained on {len(per_user)} users "
+                      f"({time.perf_counter() - start:.1f} s)")
+                # Workers read the new UBM on first use
+        
+        futures = {pool.submit(_train_user, user_id, recordings[user_id]): user_id for user_id in todo}
+        for future in as_completed(futures):
+            try:
+                user_id, weights, means, precisions, stats, adaptation, method, prefilter = future.result()
+            except Exception as e:
+                failed[futures[future]] = e
+                continue
+            if prefilter is not None:
+                # Stored first: a user counts as retrained once their bank row exists
+                *params, reject_below = prefilter
+                staging.prefilter_bank.put(user_id, *params, reject_below=reject_below)
+            staging.bank.put(user_id, weights, means, precisions, stats, adaptation, method=method, version=1,
+                             retrained=True)
+            trained += 1
+            elapsed = time.perf_counter() - start
+            print(f"[{trained}/{len(todo)}] {user_id} ({trained / elapsed:.2f} users/s)")
+    
+    elapsed = time.perf_counter() - start
+    print(f"\nTrained {trained} users in {elapsed:.1f} s ({trained / max(elapsed, 1e-9):.2f} users/s)")
+    
+    for user_id, error in failed.items():
+        print(f"Failed to retrain {user_id}: {error}")
+    if failed:
+        print("Live models left untouched; rerun to retry the failed users.")
+        return trained
+    
+    incompatible = _carry_over(live, staging, missing)
+    if incompatible and not drop_missing:
+        print("These users have no recordings and their models no longer fit: " + ", ".join(incompatible))
+        print("Live models left untouched; re-enroll them or rerun with --drop-missing.")
+        return trained
+    
+    live.bank.close()
+    _install(models_dir, staging, use_ubm)
+    for user_id in staging.bank.user_ids():
+        if staging.bank.get_meta(user_id).get('retrained'):
+            # Earlier versions belong to the replaced model
+            shutil.rmtree(live._history_dir(user_id), ignore_errors=True)
+    print(f"Installed retrained models for {len(staging.bank)} users "
+          f"(previous bank kept in {os.path.join(models_dir, 'bank.previous')}).")
+    
+    # Z-norm statistics belong to the old models; the features come from the cache the workers filled
+    from voice_processor import VoiceProcessor
+    from feature_cache import FeatureCache
+    processor = VoiceProcessor(n_mfcc=n_mfcc, cache=FeatureCache(cache_dir) if cache_dir else None, dtype=dtype)
+    installed = SpeakerVerifier(n_components=n_components, use_ubm=use_ubm, models_dir=models_dir)
+    updated = installed.compute_znorm(load_cohort_features(processor, recordings_dir))
+    print(f"Score normalization updated for {updated} users.")
+    return trained
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain every enrolled user's voice model.")
+    parser.add_argument("--recordings", default="recordings", help="directory of <user>_enroll_<n>.wav files")
+    parser.add_argument("--models", default="models", help="models directory holding the live bank")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--n-components", type=int, default=16)
+    parser.add_argument("--n-mfcc", type=int, default=13)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float64"])
+    parser.add_argument("--no-ubm", action="store_true", help="fit each user with EM instead of MAP adaptation")
+    parser.add_argument("--no-cascade", action="store_true",
+                        help="skip the pre-filter models (any installed ones are removed)")
+    parser.add_argument("--cache-dir", default="feature_cache", help="feature cache directory ('' to disable)")
+    parser.add_argument("--restart", action="store_true", help="discard an interrupted run instead of resuming")
+    parser.add_argument("--drop-missing", action="store_true",
+                        help="install even if users without recordings cannot keep their model")
+    args = parser.parse_args()
+    
+    retrain(args.recordings, args.models, args.workers, args.n_components, args.n_mfcc, not args.no_ubm,
+            args.dtype, args.cache_dir or None, args.restart, args.drop_missing, not args.no_cascade)
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,944 @@
 from sklearn.mixture import GaussianMixture
+from sklearn.exceptions import ConvergenceWarning
 import numpy as np
-import joblib
 import os
+import shutil
+import threading
+import time
+import warnings
+from voice_processor import RunningStats
+from gmm_scoring import CompactGMM, DiagGMMScorer, StackedGMMScorer, logsumexp
+from model_bank import ModelBank
+from model_cache import ModelCache
 
 class SpeakerVerifier:
-    def __init__(self, n_components=16, threshold=-50):
+    def __init__(self, n_components=16, threshold=-50, use_ubm=False, relevance_factor=16.0, llr_threshold=0.0,
+                 top_c=None, cache_entries=None, cache_bytes=None, models_dir="models", adapt_margin=1.0,
+                 adapt_interval=3600.0, adapt_max_frames=20000, history_limit=5, score_norm=None,
+                 norm_threshold=2.0, cohort_size=100, model_dtype=None, streaming_em=False, em_chunk_size=8192,
+                 em_subsample=None, cascade=False, prefilter_components=4, prefilter_frames=32,
+                 prefilter_quantile=0.01, prefilter_margin=1.0):
         self.n_components = n_components
         self.threshold = threshold
-        self.models = {}
-        self.models_dir = "models"
+        self.use_ubm = use_ubm  # MAP-adapt users from the background model and score likelihood ratios
+        self.relevance_factor = relevance_factor
+        self.llr_threshold = llr_threshold  # Decision threshold on the user-vs-UBM log-likelihood ratio
+        self.top_c = top_c  # In UBM mode, score only the UBM's top-C components per frame
+        # Online adaptation: minimum LLR above llr_threshold, minimum seconds between updates
+        # per user, cap on accumulated frames (older data is scaled down) and versions kept
+        self.adapt_margin = adapt_margin
+        self.adapt_interval = adapt_interval
+        self.adapt_max_frames = adapt_max_frames
+        self.history_limit = history_limit
+        self._adapt_lock = threading.Lock()
+        # Score normalization: None, 'znorm' (per-user impostor stats) or 'tnorm' (cohort models);
+        # normalized scores are compared against the single norm_threshold
+        self.score_norm = score_norm
+        self.norm_threshold = norm_threshold
+        self.cohort_size = cohort_size  # Models in the T-norm cohort
+        self.model_dtype = model_dtype  # 'float16' or 'int8' keeps cached models quantized (CompactGMM)
+        # Fit user models with StreamingGMMTrainer over chunks of frames instead of GaussianMixture
+        self.streaming_em = streaming_em
+        self.em_chunk_size = em_chunk_size
+        self.em_subsample = em_subsample
+        # Cascade: a prefilter_components-component model scores prefilter_frames frames first and
+        # rejects attempts scoring below the user's calibrated bound (the prefilter_quantile of
+        # held-out genuine enrollment subsamples, minus prefilter_margin) before the full model runs
+        self.cascade = cascade
+        self.prefilter_components = prefilter_components
+        self.prefilter_frames = prefilter_frames
+        self.prefilter_quantile = prefilter_quantile
+        self.prefilter_margin = prefilter_margin
+        self.prefilter_ubm = None
+        self.prefilters = ModelCache(cache_entries)
+        self._cascade_counts = {'attempts': 0, 'prefilter_rejects': 0, 'full_scored': 0}
+        self._cascade_lock = threading.Lock()
+        self.ubm = None
+        # Normalization statistics of the UBM's training frames; in UBM mode user models and test
+        # utterances are scaled with these so all three share one feature space
+        self.ubm_stats = None
+        # Loaded DiagGMMScorer models, bounded by entry count and/or bytes
+        self.models = ModelCache(cache_entries, cache_bytes, on_evict=self._on_evict)
+        self._stacked = None  # (user_ids, user bank, UBM bank) for identify(), rebuilt on changes
+        self._cohort = None  # The same for the T-norm cohort
+        self.stats = {}  # Per-user feature normalization statistics, evicted with the model
+        self.models_dir = models_dir
         
         # Create models directory if it doesn't exist
         if not os.path.exists(self.models_dir):
             os.makedirs(self.models_dir)
+            
+        # All user models live in one memory-mapped bank, pre-filter models in a second one
+        self.bank = ModelBank(os.path.join(self.models_dir, "bank"))
+        self.prefilter_bank = ModelBank(os.path.join(self.models_dir, "prefilter")) if cascade else None
     
-    def train_model(self, user_id, features):
-        """Train a GMM model for a specific user."""
+    def _fit_gmm(self, features, on_progress=None, max_iter=200, n_components=None):
+        """Fit a diagonal GMM with EM and return its scoring kernel.
+        
+        With `on_progress`, EM runs one warm-started iteration at a time and
+        calls on_progress('em', iteration, max_iter) after each; the callback
+        may raise to abort training. With streaming_em, the frames are fed to
+        StreamingGMMTrainer in chunks of em_chunk_size.
+        """
+        if self.streaming_em:
+            chunks = [features[start:start + self.em_chunk_size] for start in range(0, len(features), self.em_chunk_size)]
+            return self.train_streaming(chunks, on_progress=on_progress, max_iter=max_iter, n_components=n_components)
+        
         gmm = GaussianMixture(
-            n_components=self.n_components,
+            n_components=n_components or self.n_components,
             covariance_type='diag',
-            max_iter=200,
+            max_iter=max_iter,
             random_state=42
         )
         
-        gmm.fit(features)
-        self.models[user_id] = gmm
+        if on_progress is None:
+            gmm.fit(features)
+            return DiagGMMScorer.from_gmm(gmm)
+        
+        gmm.set_params(max_iter=1, warm_start=True)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", ConvergenceWarning)  # Expected with max_iter=1
+            for iteration in range(1, max_iter + 1):
+                gmm.fit(features)
+                on_progress('em', iteration, max_iter)
+                if gmm.converged_:
+                    break
+        return DiagGMMScorer.from_gmm(gmm)
+    
+    def train_ubm(self, features, warm_start=False):
+        """Train the Universal Background Model on pooled features from many speakers.
+        
+        `features` are raw (unnormalized) features: a matrix, a list of
+        per-speaker or per-file matrices, or a callable returning a fresh
+        iterator of chunks. They are standardized with statistics pooled
+        over all of them, which are stored with the UBM (ubm_stats) and used
+        for every MAP-adapted model and test utterance. A callable is
+        trained with streaming EM, so the pooled audio never has to fit in
+        memory; `warm_start` then continues from the current UBM and its
+        statistics.
+        """
+        if callable(features):
+            init = self.load_ubm() if warm_start else None
+            stats = self.ubm_stats if init is not None else None
+            if stats is None:
+                stats = RunningStats()
+                for chunk in features():
+                    stats.update(chunk)
+            chunks = features
+            features = lambda: (stats.transform(chunk) for chunk in chunks())
+            self.ubm = self.train_streaming(features, init=init)
+            if self.cascade:
+                self.prefilter_ubm = self.train_streaming(features, n_components=self.prefilter_components)
+        else:
+            if isinstance(features, (list, tuple)):
+                features = np.vstack(features)
+            stats = RunningStats().update(features)
+            features = stats.transform(features)
+            self.ubm = self._fit_gmm(features)
+            if self.cascade:
+                # The pre-filter's own small background model
+                self.prefilter_ubm = self._fit_gmm(features, n_components=self.prefilter_components)
+        self.ubm_stats = stats
+        self._invalidate_banks()
+        self._save_ubm()
+        return self.ubm
+    
+    def train_streaming(self, chunks, init=None, on_progress=None, max_iter=200, n_components=None):
+        """Fit a diagonal GMM with mini-batch streaming EM (see StreamingGMMTrainer)."""
+        from streaming_em import StreamingGMMTrainer
+        
+        trainer = StreamingGMMTrainer(n_components or self.n_components, max_iter=max_iter,
+                                      subsample=self.em_subsample)
+        report = None
+        if on_progress is not None:
+            report = lambda iteration, log_likelihood: on_progress('em', iteration, max_iter)
+        return trainer.fit(chunks, init=init, on_progress=report)
+    
+    def _save_ubm(self):
+        stats = {}
+        if self.ubm_stats is not None:
+            stats = {'stats_count': self.ubm_stats.count, 'stats_mean': self.ubm_stats.mean,
+                     'stats_m2': self.ubm_stats.m2}
+        for name, ubm in (("ubm.npz", self.ubm), ("ubm_prefilter.npz", self.prefilter_ubm)):
+            if ubm is not None:
+                np.savez(
+                    os.path.join(self.models_dir, name),
+                    weights=ubm.weights,
+                    means=ubm.means,
+                    precisions=ubm.precisions,
+                    **stats
+                )
+    
+    def load_prefilter_ubm(self):
+        """Load the pre-filter's small background model if one has been trained."""
+        if self.prefilter_ubm is None:
+            path = os.path.join(self.models_dir, "ubm_prefilter.npz")
+            if os.path.exists(path):
+                data = np.load(path)
+                self.prefilter_ubm = DiagGMMScorer(data['weights'], data['means'], data['precisions'])
+        return self.prefilter_ubm
+    
+    def load_ubm(self):
+        """Load the Universal Background Model if one has been trained."""
+        if self.ubm is None:
+            ubm_path = os.path.join(self.models_dir, "ubm.npz")
+            legacy_path = os.path.join(self.models_dir, "ubm.joblib")
+            if os.path.exists(ubm_path):
+                data = np.load(ubm_path)
+                self.ubm = DiagGMMScorer(data['weights'], data['means'], data['precisions'])
+                if 'stats_mean' in data.files:
+                    self.ubm_stats = RunningStats()
+                    self.ubm_stats.count = int(data['stats_count'])
+                    self.ubm_stats.mean, self.ubm_stats.m2 = data['stats_mean'], data['stats_m2']
+            elif os.path.exists(legacy_path):
+                import joblib
+                self.ubm = DiagGMMScorer.from_gmm(joblib.load(legacy_path))
+                self._save_ubm()
+                os.remove(legacy_path)
+        return self.ubm
+    
+    def map_adapt(self, features):
+        """Derive a speaker model by MAP-adapting the UBM means in one closed-form pass.
+        
+        Each component mean moves towards the speaker's data in proportion
+        to n_k / (n_k + relevance_factor), where n_k is the component's soft
+        frame count; weights and variances are shared with the UBM.
+        """
+        return self._map_model(*self.map_statistics(features))
+    
+    def map_statistics(self, features, ubm=None):
+        """Per-component soft frame counts and first-order sums against the UBM (or `ubm`)."""
+        responsibilities = (ubm or self.load_ubm()).predict_proba(features)  # (n_frames, n_components)
+        counts = responsibilities.sum(axis=0, dtype=np.float64)
+        first_order = (responsibilities.T @ features).astype(np.float64)
+        return counts, first_order
+    
+    def _map_model(self, counts, first_order, adapt_weights=False, ubm=None):
+        """Build the MAP model for accumulated statistics; optionally adapt the weights too."""
+        ubm = ubm or self.load_ubm()
+        data_means = first_order / np.maximum(counts, np.finfo(float).eps)[:, None]
+        alpha = counts / (counts + self.relevance_factor)
+        means = alpha[:, None] * data_means + (1 - alpha[:, None]) * ubm.means
+        
+        weights = ubm.weights
+        if adapt_weights:
+            weights = alpha * counts / counts.sum() + (1 - alpha) * ubm.weights
+            weights = weights / weights.sum()
+        return DiagGMMScorer(weights, means, ubm.precisions)
+    
+    def train_model(self, user_id, features, stats=None, on_progress=None, lengths=None):
+        """Train a GMM model for a specific user.
+        
+        `stats` are the normalization statistics the features were scaled
+        with; they are stored with the model and used for verification.
+        In UBM mode the model is MAP-adapted from the background model
+        instead of being fitted with EM. `on_progress(stage, done, total)`
+        is called for each EM iteration ('em'), for MAP adaptation ('map')
+        and before saving ('saving'); raising from it aborts training
+        before anything is stored. `lengths` are the frame counts of the
+        enrollment files making up `features`, used to calibrate the
+        cascade pre-filter on held-out files. In UBM mode the features are
+        rescaled into the UBM's feature space first, and the UBM's stats
+        are stored as the user's.
+        """
+        features, stats = self._ubm_space(features, stats)
+        model, method, adaptation = self.fit_model(features, on_progress)
+        prefilter = self.fit_prefilter(features, lengths) if self.cascade else None
+        if on_progress is not None:
+            on_progress('saving', 0, 1)
+        if stats is not None:
+            self.stats[user_id] = stats
+        self._cache_model(user_id, model)
+        self._invalidate_banks()
+        
+        # Save the model; a new enrollment starts a new version history and
+        # needs its Z-norm statistics recomputed
+        shutil.rmtree(self._history_dir(user_id), ignore_errors=True)
+        self.bank.put(user_id, model.weights, model.means, model.precisions, stats, adaptation,
+                      method=method, version=1, znorm_mean=None, znorm_std=None)
+        if prefilter is not None:
+            prefilter_model, reject_below = prefilter
+            self.prefilter_bank.put(user_id, prefilter_model.weights, prefilter_model.means,
+                                    prefilter_model.precisions, reject_below=reject_below)
+            self.prefilters[user_id] = prefilter_model
+        
+        return model
+    
+    def _ubm_space(self, features, stats):
+        """Rescale features standardized with `stats` to the UBM's stats; returns (features, stats).
+        
+        Unchanged outside UBM mode, or for a UBM saved without statistics.
+        """
+        if not self._uses_llr() or self.ubm_stats is None or stats is None or stats is self.ubm_stats:
+            return features, stats
+        raw = stats.mean + features * stats.scale
+        return self.ubm_stats.transform(raw.astype(features.dtype, copy=False)), self.ubm_stats
+    
+    def fit_model(self, features, on_progress=None):
+        """Fit a user model without storing it.
+        
+        Returns (model, method, adaptation), where adaptation holds the MAP
+        sufficient statistics (None for EM models).
+        """
+        if self.use_ubm and self.load_ubm() is not None:
+            adaptation = self.map_statistics(features)
+            model = self._map_model(*adaptation)
+            if on_progress is not None:
+                on_progress('map', 1, 1)
+            return model, 'map', adaptation
+        return self._fit_gmm(features, on_progress), 'em', None
+    
+    def fit_prefilter(self, features, lengths=None):
+        """Fit the cascade's low-order model and calibrate its reject bound.
+        
+        The pre-filter is MAP-adapted from the small background model when
+        there is one, else fitted with EM. Its reject bound is the
+        prefilter_quantile of the scores of random prefilter_frames-frame
+        subsamples, minus prefilter_margin. The subsamples are scored
+        held-out, each by a pre-filter fitted without the enrollment file
+        it comes from (`lengths` gives the frames per file). With fewer than
+        two files, three contiguous blocks of the features stand in for
+        files. Returns (model, reject_below).
+        """
+        if lengths is not None and len(lengths) >= 2:
+            folds = np.split(features, np.cumsum(lengths)[:-1])
+        else:
+            folds = np.array_split(features, 3)
+        folds = [fold for fold in folds if len(fold)]
+        
+        rng = np.random.default_rng(0)
+        n_subsamples = max(200 // len(folds), 20)
+        genuine = np.concatenate([
+            self._prefilter_subsample_scores(
+                self._fit_prefilter_model(np.concatenate(folds[:i] + folds[i + 1:])), held_out, rng, n_subsamples)
+            for i, held_out in enumerate(folds)])
+        threshold = np.quantile(genuine, self.prefilter_quantile) - self.prefilter_margin
+        return self._fit_prefilter_model(features), float(threshold)
+    
+    def _fit_prefilter_model(self, features):
+        small_ubm = self.load_prefilter_ubm() if self._uses_llr() else None
+        if small_ubm is not None:
+            return self._map_model(*self.map_statistics(features, small_ubm), ubm=small_ubm)
+        return self._fit_gmm(features, n_components=self.prefilter_components)
+    
+    def _prefilter_subsample_scores(self, prefilter, features, rng, n_subsamples):
+        """Mean pre-filter scores of random prefilter_frames-frame subsamples of `features`."""
+        frames = self._prefilter_frame_scores(prefilter, features)
+        n_frames = min(self.prefilter_frames, len(frames))
+        return frames[rng.integers(len(frames), size=(n_subsamples, n_frames))].mean(axis=1)
+    
+    def _prefilter_frame_scores(self, prefilter, features):
+        """Per-frame pre-filter scores, as ratios against the small UBM when it was adapted from it."""
+        frames = prefilter.score_samples(features)
+        small_ubm = self.load_prefilter_ubm() if self._uses_llr() else None
+        if small_ubm is not None and self._shares_ubm_components(prefilter, small_ubm):
+            frames = frames - small_ubm.score_samples(features)
+        return frames
+    
+    def _prefilter_rejects(self, user_id, features):
+        """Run the cascade's first stage: True if the attempt is a clear reject."""
+        prefilter = self.prefilters.get(user_id)
+        if prefilter is None and user_id in self.prefilter_bank:
+            prefilter = DiagGMMScorer(*self.prefilter_bank.get(user_id))
+            self.prefilters[user_id] = prefilter
+            
+        rejected = False
+        if prefilter is not None and len(features):
+            # An evenly spaced subsample of frames
+            step = max(1, len(features) // self.prefilter_frames)
+            sample = features[::step][:self.prefilter_frames]
+            score = self._prefilter_frame_scores(prefilter, sample).mean()
+            rejected = score < self.prefilter_bank.get_meta(user_id)['reject_below']
+            
+        with self._cascade_lock:
+            self._cascade_counts['attempts'] += 1
+            self._cascade_counts['prefilter_rejects' if rejected else 'full_scored'] += 1
+        return rejected
+    
+    def cascade_stats(self):
+        """Cascade counters: attempts, pre-filter rejects and full-model scorings, with their rates."""
+        with self._cascade_lock:
+            counts = dict(self._cascade_counts)
+        attempts = max(counts['attempts'], 1)
+        counts['prefilter_reject_rate'] = counts['prefilter_rejects'] / attempts
+        counts['full_scored_rate'] = counts['full_scored'] / attempts
+        return counts
+    
+    def adapt_model(self, user_id, features, score):
+        """Fold an accepted verification into the user's MAP model.
         
-        # Save the model
-        model_path = os.path.join(self.models_dir, f"{user_id}_model.joblib")
-        joblib.dump(gmm, model_path)
+        Only verifications scoring at least adapt_margin above the decision
+        threshold count, at most once per adapt_interval seconds per user. The new
+        frames' statistics are added to the stored ones and means and
+        weights are recomputed in closed form, so the cost does not grow
+        with the amount of past audio. The previous version is kept for
+        rollback_model(). Z-norm statistics belong to the previous model and
+        are cleared; recompute them with compute_znorm(). Returns the new
+        version, or None if no update was made.
+        """
+        if score < self._threshold(user_id) + self.adapt_margin:
+            return None
         
-        return gmm
+        with self._adapt_lock:
+            meta = self.bank.get_meta(user_id)
+            if time.time() - meta.get('adapted_at', 0) < self.adapt_interval:
+                return None
+            model = self.models.get(user_id) or self.load_model(user_id)
+            adaptation = self.bank.get_adaptation(user_id)
+            if model is None or adaptation is None or not self._shares_ubm_components(model):
+                return None  # Only MAP models trained against the current UBM can be updated
+            
+            counts, first_order = self.map_statistics(features)
+            counts += adaptation[0]
+            first_order += adaptation[1]
+            if self.adapt_max_frames and counts.sum() > self.adapt_max_frames:
+                # Scale down old data so recent audio keeps a say (tracks drift)
+                factor = self.adapt_max_frames / counts.sum()
+                counts *= factor
+                first_order *= factor
+            updated = self._map_model(counts, first_order, adapt_weights=True)
+            
+            version = meta.get('version', 1)
+            self._save_version(user_id, version, self.bank.get(user_id), adaptation, meta)
+            self._cache_model(user_id, updated)
+            self._invalidate_banks()
+            self.bank.put(user_id, updated.weights, updated.means, updated.precisions, self.get_stats(user_id),
+                          (counts, first_order), version=version + 1, adapted_at=time.time(),
+                          znorm_mean=None, znorm_std=None)
+            return version + 1
+    
+    def _history_dir(self, user_id):
+        return os.path.join(self.models_dir, "history", user_id)
+    
+    def _save_version(self, user_id, version, params, adaptation, meta):
+        """Keep a model version (stored weights, means, precisions and Z-norm statistics) on disk for rollback."""
+        history_dir = self._history_dir(user_id)
+        os.makedirs(history_dir, exist_ok=True)
+        weights, means, precisions = params
+        znorm = [meta['znorm_mean'], meta['znorm_std']] if meta.get('znorm_std') else []
+        np.savez(
+            os.path.join(history_dir, f"v{version}.npz"),
+            weights=weights,
+            means=means,
+            precisions=precisions,
+            counts=adaptation[0],
+            first_order=adaptation[1],
+            znorm=np.array(znorm, dtype=np.float64)
+        )
+        for old in self.model_versions(user_id)[:-self.history_limit]:
+            os.remove(os.path.join(history_dir, f"v{old}.npz"))
+    
+    def model_versions(self, user_id):
+        """Versions of a user's model that can be restored with rollback_model(), oldest first."""
+        history_dir = self._history_dir(user_id)
+        if not os.path.isdir(history_dir):
+            return []
+        return sorted(int(name[1:-4]) for name in os.listdir(history_dir) if name.endswith(".npz"))
+    
+    def rollback_model(self, user_id, version=None):
+        """Restore an earlier version of a user's model (default: the previous one).
+        
+        Newer versions are discarded, and the Z-norm statistics the version
+        had are restored (cleared if it had none). Returns the restored
+        version, or None if it is not available.
+        """
+        with self._adapt_lock:
+            versions = self.model_versions(user_id)
+            if version is None:
+                version = versions[-1] if versions else None
+            if version not in versions:
+                return None
+            
+            path = os.path.join(self._history_dir(user_id), f"v{version}.npz")
+            data = np.load(path)
+            model = DiagGMMScorer(data['weights'], data['means'], data['precisions'])
+            znorm = data['znorm'].tolist() if 'znorm' in data.files else []
+            znorm_mean, znorm_std = znorm if len(znorm) == 2 else (None, None)
+            self.bank.put(user_id, model.weights, model.means, model.precisions, self.get_stats(user_id),
+                          (data['counts'], data['first_order']), version=version,
+                          znorm_mean=znorm_mean, znorm_std=znorm_std)
+            data.close()
+            for newer in versions[versions.index(version):]:
+                os.remove(os.path.join(self._history_dir(user_id), f"v{newer}.npz"))
+            self._cache_model(user_id, model)
+            self._invalidate_banks()
+            return version
     
     def load_model(self, user_id):
         """Load a trained GMM model for a specific user."""
-        model_path = os.path.join(self.models_dir, f"{user_id}_model.joblib")
-        if os.path.exists(model_path):
-            self.models[user_id] = joblib.load(model_path)
-            return self.models[user_id]
-        return None
+        model = self._read_model(user_id)
+        if model is None:
+            return None
+        self.get_stats(user_id)
+        return self._cache_model(user_id, model)
+    
+    def _read_model(self, user_id):
+        """Read a user's model from the bank (migrating a legacy file) without caching it."""
+        params = self.bank.get(user_id)
+        if params is None:
+            params = self._migrate_legacy_model(user_id)
+            if params is None:
+                return None
+        return DiagGMMScorer(*params)
+    
+    def preload_models(self, recent=None, on_progress=None):
+        """Load the UBM and user models into the cache ahead of first use.
+        
+        Users in `recent` (most recent first) are loaded first, then the rest
+        of the bank by last update. Loading stops before a model would
+        exceed the cache's entry or byte budget, so preloading never evicts
+        anything. Models are inserted least recent first, leaving the most
+        recent user at the most recently used end of the cache.
+        `on_progress(done, total)` is called after each model. Returns the
+        number of models loaded.
+        """
+        self.load_ubm()
+        
+        stored = set(self.list_users())
+        order = [user_id for user_id in dict.fromkeys(recent or []) if user_id in stored]
+        rest = sorted(stored - set(order), key=lambda uid: self.bank.get_meta(uid).get('updated_at', 0), reverse=True)
+        order += rest
+        
+        free_entries = self.models.max_entries
+        if free_entries is not None:
+            free_entries -= len(self.models)
+        free_bytes = self.models.max_bytes
+        if free_bytes is not None:
+            free_bytes -= self.models.bytes_resident
+            
+        selected = []  # (user_id, model or None if already resident), most recent first
+        for done, user_id in enumerate(order, 1):
+            if user_id in self.models:
+                selected.append((user_id, None))
+            else:
+                if free_entries is not None and free_entries <= 0:
+                    break
+                model = self._read_model(user_id)
+                if model is not None:
+                    model = self._resident_model(model)
+                    if free_bytes is not None:
+                        if model.nbytes > free_bytes:
+                            break
+                        free_bytes -= model.nbytes
+                    if free_entries is not None:
+                        free_entries -= 1
+                    selected.append((user_id, model))
+            if on_progress is not None:
+                on_progress(done, len(order))
+                
+        for user_id, model in reversed(selected):
+            if model is None:
+                self.models.touch(user_id)
+            else:
+                self.get_stats(user_id)
+                self.models[user_id] = model
+        return sum(model is not None for _, model in selected)
+    
+    def _resident_model(self, model):
+        """The form a model is kept in the cache: quantized when model_dtype is set."""
+        if self.model_dtype is not None:
+            shared = self.ubm.precisions if self._shares_ubm_components(model) else None
+            model = CompactGMM.from_scorer(model, self.model_dtype, shared)
+        return model
+    
+    def _cache_model(self, user_id, model):
+        """Put a model in the cache, quantized when model_dtype is set."""
+        model = self._resident_model(model)
+        self.models[user_id] = model
+        return model
+    
+    def _on_evict(self, user_id):
+        self.stats.pop(user_id, None)
+    
+    def pin_user(self, user_id):
+        """Keep a (frequent) user's model resident regardless of the cache budget."""
+        self.models.pin(user_id)
+        
+    def unpin_user(self, user_id):
+        self.models.unpin(user_id)
+    
+    def cache_stats(self):
+        """Model cache counters: hits, misses, evictions, entries and bytes resident."""
+        return self.models.stats()
+    
+    def _legacy_paths(self, user_id):
+        return (os.path.join(self.models_dir, f"{user_id}_model.joblib"),
+                os.path.join(self.models_dir, f"{user_id}_stats.npz"))
+    
+    def _migrate_legacy_model(self, user_id):
+        """Move a per-user joblib model (and its stats file) into the bank."""
+        model_path, stats_path = self._legacy_paths(user_id)
+        if not os.path.exists(model_path):
+            return None
+        
+        import joblib
+        model = DiagGMMScorer.from_gmm(joblib.load(model_path))
+        stats = RunningStats.load(stats_path) if os.path.exists(stats_path) else None
+        self.bank.put(user_id, model.weights, model.means, model.precisions, stats, method='legacy')
+        
+        for path in (model_path, stats_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return model.weights, model.means, model.precisions
+    
+    def get_stats(self, user_id):
+        """Return a user's normalization statistics, loading them if needed."""
+        if user_id not in self.stats:
+            if user_id not in self.bank:
+                self._migrate_legacy_model(user_id)
+            stored = self.bank.get_stats(user_id)
+            if stored is None:
+                return None
+            stats = RunningStats()
+            stats.count, stats.mean, stats.m2 = stored
+            self.stats[user_id] = stats
+        return self.stats[user_id]
     
     def verify_speaker(self, user_id, features):
         """Verify if the speaker matches the claimed identity."""
-        if user_id not in self.models:
+        model = self.models.get(user_id)
+        if model is None:
             # Try to load the model if it exists
             model = self.load_model(user_id)
             if model is None:
                 return False, -float('inf')
         
-        # Calculate log-likelihood
-        log_likelihood = self.models[user_id].score(features)
+        if self.cascade and self._prefilter_rejects(user_id, features):
+            return False, -float('inf')  # Clear reject; the full model is not run
+        
+        score = float(np.mean(self._frame_scores(model, features)))
+        if self.score_norm:
+            normalized = self._normalize_score(user_id, score, features)
+            if normalized is not None:
+                return bool(normalized > self.norm_threshold), float(normalized)
         
         # Make decision based on threshold
-        is_verified = log_likelihood > self.threshold
+        return score > self._raw_threshold(), score
+    
+    def _uses_llr(self):
+        return self.use_ubm and self.load_ubm() is not None
+    
+    def _raw_threshold(self):
+        return self.llr_threshold if self._uses_llr() else self.threshold
+    
+    def _norm_mode(self, user_id):
+        """The score normalization that applies to this user, or None."""
+        if self.score_norm == 'znorm' and self.bank.get_meta(user_id).get('znorm_std'):
+            return 'znorm'
+        if self.score_norm == 'tnorm' and self.get_stats(user_id) is not None and self._tnorm_cohort()[1] is not None:
+            return 'tnorm'
+        return None
+    
+    def _threshold(self, user_id):
+        """The threshold verify_speaker compares this user's scores against."""
+        return self.norm_threshold if self._norm_mode(user_id) else self._raw_threshold()
+    
+    def verify_sequential(self, user_id, features, chunk_size=16, min_frames=48, confidence=3.0):
+        """Verify with an early exit once the decision is statistically clear.
+        
+        Frames are scored in chunks of `chunk_size` and the running score is
+        compared with the threshold after each chunk (once `min_frames` have
+        been seen). Chunk means serve as samples for the standard error, as
+        neighbouring frames are strongly correlated; scoring stops when the
+        score is more than `confidence` standard errors from the threshold.
+        Scores are on the same scale as verify_speaker, including score
+        normalization. Returns (is_verified, score, frames_used).
+        """
+        model = self.models.get(user_id)
+        if model is None:
+            model = self.load_model(user_id)
+        if model is None or len(features) == 0:
+            return False, -float('inf'), 0
+        if self.cascade and self._prefilter_rejects(user_id, features):
+            return False, -float('inf'), min(self.prefilter_frames, len(features))
+        
+        mode = self._norm_mode(user_id)
+        threshold = self._threshold(user_id)
+        if mode == 'tnorm':
+            stats = self.get_stats(user_id)
+            cohort_ids, cohort, ubm_cohort = self._tnorm_cohort()
+            others = np.asarray(cohort_ids) != user_id
+            cohort_totals = np.zeros(cohort.n_models)
+        elif mode == 'znorm':
+            meta = self.bank.get_meta(user_id)
+            
+        chunk_means = RunningStats()
+        used, total = 0, 0.0
+        for start in range(0, len(features), chunk_size):
+            chunk = features[start:start + chunk_size]
+            frames = self._frame_scores(model, chunk)
+            used += len(frames)
+            total += frames.sum()
+            chunk_means.update(np.array([[frames.mean()]]))
+            
+            score = total / used
+            spread = 1.0
+            if mode == 'znorm':
+                score, spread = (score - meta['znorm_mean']) / meta['znorm_std'], meta['znorm_std']
+            elif mode == 'tnorm':
+                # Cohort scores accumulate over the same frames
+                raw = stats.mean + chunk * stats.scale
+                chunk_scores = cohort.score(raw)
+                if ubm_cohort is not None:
+                    chunk_scores -= ubm_cohort.score(raw)
+                cohort_totals += chunk_scores * len(chunk)
+                cohort_scores = cohort_totals[others] / used
+                spread = max(cohort_scores.std(), np.finfo(float).eps)
+                score = (score - cohort_scores.mean()) / spread
+            
+            if used == len(features):
+                break
+            if used >= min_frames and chunk_means.count > 1:
+                standard_error = np.sqrt(chunk_means.m2[0] / (chunk_means.count - 1) / chunk_means.count) / spread
+                if abs(score - threshold) > confidence * standard_error:
+                    break
+        
+        return bool(score > threshold), float(score), used
+    
+    def _frame_scores(self, model, features, fast=True):
+        """Per-frame scores: likelihood ratios against the UBM in UBM mode, else log-likelihoods.
+        
+        With `fast`, MAP models are scored with top-C Gaussian selection.
+        """
+        if fast and self.top_c and self._shares_ubm_components(model):
+            return self._fast_llr_frames(model, features)
+        
+        frames = model.score_samples(features)
+        if self._uses_llr():
+            # Likelihood ratio against the background model
+            frames = frames - self.ubm.score_samples(features)
+        return frames
+    
+    def _normalize_score(self, user_id, score, features):
+        """Z- or T-normalize a raw score; None when the statistics are unavailable."""
+        if self.score_norm == 'znorm':
+            meta = self.bank.get_meta(user_id)
+            if not meta.get('znorm_std'):
+                return None
+            return (score - meta['znorm_mean']) / meta['znorm_std']
+        
+        if self.score_norm == 'tnorm':
+            stats = self.get_stats(user_id)
+            cohort_ids, cohort, ubm_cohort = self._tnorm_cohort()
+            if stats is None or cohort is None:
+                return None
+            # The cohort folds in each model's own normalization, so it scores raw features
+            raw = stats.mean + features * stats.scale
+            scores = cohort.score(raw)
+            if ubm_cohort is not None:
+                scores -= ubm_cohort.score(raw)
+            scores = scores[np.asarray(cohort_ids) != user_id]
+            if len(scores) < 2:
+                return None
+            return (score - scores.mean()) / max(scores.std(), np.finfo(float).eps)
+        
+        raise ValueError(f"Unknown score normalization: {self.score_norm}")
+    
+    def compute_znorm(self, cohort, user_ids=None):
+        """Compute and store each user's Z-norm impostor score statistics.
+        
+        `cohort` maps speaker IDs to lists of raw (unnormalized) utterance
+        features, typically everyone's enrollment recordings. For each user
+        in `user_ids` (default: every enrolled user with stored stats), all
+        other speakers' utterances are scored in one vectorized pass and the
+        mean and standard deviation of those impostor scores are stored in
+        the bank metadata. Scores use full (not top-C) evaluation. Users
+        whose model is adapted or rolled back meanwhile are skipped. Returns
+        the number of users updated.
+        """
+        owners, utterances = [], []
+        for speaker_id, speaker_utterances in cohort.items():
+            for features in speaker_utterances:
+                owners.append(speaker_id)
+                utterances.append(features)
+        if not utterances:
+            return 0
+        frames = np.vstack(utterances)
+        starts = np.cumsum([0] + [len(features) for features in utterances[:-1]])
+        lengths = np.array([len(features) for features in utterances])
+        owners = np.array(owners)
+        
+        updated = 0
+        for user_id in user_ids if user_ids is not None else self.list_users():
+            version = self.bank.get_meta(user_id).get('version')
+            model = self.models.get(user_id) or self.load_model(user_id)
+            stats = self.get_stats(user_id)
+            impostor = owners != user_id
+            if model is None or stats is None or impostor.sum() < 2:
+                continue
+            frame_scores = self._frame_scores(model, stats.transform(frames), fast=False)
+            scores = (np.add.reduceat(frame_scores, starts) / lengths)[impostor]
+            with self._adapt_lock:
+                if self.bank.get_meta(user_id).get('version') != version:
+                    continue  # The statistics belong to a model that has been replaced
+                self.bank.update_meta(user_id, znorm_mean=float(scores.mean()),
+                                      znorm_std=float(max(scores.std(), np.finfo(float).eps)))
+            updated += 1
+        return updated
+    
+    def _invalidate_banks(self):
+        self._stacked = None
+        self._cohort = None
+    
+    def _stack_rows(self, rows):
+        """Stacked user and UBM scorers for bank rows, with each user's normalization folded in."""
+        # Per-user normalization, vectorized over users
+        stats = RunningStats()
+        stats.count, stats.mean, stats.m2 = rows['stats_count'][:, None], rows['stats_mean'], rows['stats_m2']
+        shifts, scales = stats.mean, stats.scale
+        
+        bank = StackedGMMScorer(rows['weights'], rows['means'], rows['precisions'], shifts, scales)
+        ubm_bank = None
+        if self._uses_llr():
+            n_users = len(rows['weights'])
+            ubm_bank = StackedGMMScorer(
+                np.broadcast_to(self.ubm.weights, (n_users,) + self.ubm.weights.shape),
+                np.broadcast_to(self.ubm.means, (n_users,) + self.ubm.means.shape),
+                np.broadcast_to(self.ubm.precisions, (n_users,) + self.ubm.precisions.shape),
+                shifts,
+                scales
+            )
+        return bank, ubm_bank
+    
+    def _stacked_bank(self):
+        """Stack every enrolled user's model, with their normalization folded in."""
+        if self._stacked is None:
+            for user_id in self.list_users():
+                if user_id not in self.bank:
+                    self._migrate_legacy_model(user_id)
+                    
+            rows = self.bank.all_rows(['weights', 'means', 'precisions', 'stats_mean', 'stats_m2'])
+            if not rows['user_ids']:
+                return [], None, None
+            
+            self._stacked = (rows['user_ids'],) + self._stack_rows(rows)
+        return self._stacked
+    
+    def _tnorm_cohort(self):
+        """The T-norm cohort: up to cohort_size enrolled users' models, stacked once and cached."""
+        if self._cohort is None:
+            rows = self.bank.all_rows(['weights', 'means', 'precisions', 'stats_mean', 'stats_m2'])
+            user_ids = rows.pop('user_ids')
+            # Users trained without normalization statistics cannot be folded in
+            keep = np.flatnonzero(rows.get('stats_count', np.zeros(0)) > 0) if user_ids else np.zeros(0, int)
+            if len(keep) > self.cohort_size:
+                keep = np.sort(np.random.default_rng(0).choice(keep, self.cohort_size, replace=False))
+            if len(keep) < 2:
+                self._cohort = ([], None, None)
+            else:
+                subset = {name: array[keep] for name, array in rows.items()}
+                self._cohort = ([user_ids[i] for i in keep],) + self._stack_rows(subset)
+        return self._cohort
+    
+    def identify(self, features, top_k=5):
+        """Score one utterance against every enrolled user and return the best matches.
+        
+        `features` are raw (unnormalized) features, e.g. from
+        VoiceProcessor.extract_features; each user's own normalization is
+        applied inside the stacked bank. Scores are on the same scale as
+        verify_speaker (likelihood ratios in UBM mode), Z-norm or T-norm
+        included when enabled, so each is compared with its user's own
+        normalization. Returns a list of (user_id, score) pairs, best first.
+        """
+        user_ids, bank, ubm_bank = self._stacked_bank()
+        if not user_ids:
+            return []
+        
+        scores = bank.score(features)
+        if ubm_bank is not None:
+            scores -= ubm_bank.score(features)
+        scores = self._normalize_matrix(user_ids, scores[None, :])[0]
+            
+        top_k = min(top_k, len(user_ids))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(user_ids[i], float(scores[i])) for i in best]
+    
+    def score_matrix(self, utterances, batch_size=64, max_buffer=2 ** 24):
+        """Score many utterances against every enrolled user in batched passes.
+        
+        `utterances` are raw (unnormalized) features. Returns (user_ids,
+        scores) where scores has shape (n_utterances, n_users) and uses the
+        verify_speaker scale with full (not top-C) scoring, including Z-norm
+        or T-norm when enabled; users without Z-norm statistics keep raw
+        scores. `max_buffer` bounds the per-chunk (frames, users *
+        components) buffer in elements.
+        """
+        user_ids, bank, ubm_bank = self._stacked_bank()
+        if not user_ids:
+            return [], np.zeros((len(utterances), 0))
+        
+        chunk_size = max(8, max_buffer // (bank.n_models * bank.n_components))
+        scores = np.empty((len(utterances), len(user_ids)))
+        for start in range(0, len(utterances), batch_size):
+            batch = utterances[start:start + batch_size]
+            scores[start:start + len(batch)] = bank.score_batch(batch, chunk_size)
+            if ubm_bank is not None:
+                scores[start:start + len(batch)] -= ubm_bank.score_batch(batch, chunk_size)
+        return user_ids, self._normalize_matrix(user_ids, scores)
+    
+    def _normalize_matrix(self, user_ids, scores):
+        """Apply Z-norm or T-norm to (n_utterances, n_users) raw scores, column j claiming user_ids[j]."""
+        if self.score_norm == 'znorm':
+            metas = [self.bank.get_meta(user_id) for user_id in user_ids]
+            known = np.array([bool(meta.get('znorm_std')) for meta in metas])
+            means = np.array([meta['znorm_mean'] if ok else 0.0 for meta, ok in zip(metas, known)])
+            stds = np.array([meta['znorm_std'] if ok else 1.0 for meta, ok in zip(metas, known)])
+            scores = (scores - means) / stds
+        elif self.score_norm == 'tnorm':
+            cohort_ids = set(self._tnorm_cohort()[0])
+            in_cohort = np.array([user_id in cohort_ids for user_id in user_ids])
+            if in_cohort.sum() >= 3:
+                # Cohort statistics per trial, leaving out the claimed user's own column
+                cohort = scores[:, in_cohort]
+                count = in_cohort.sum() - in_cohort
+                mean = (cohort.sum(axis=1, keepdims=True) - scores * in_cohort) / count
+                mean_sq = ((cohort ** 2).sum(axis=1, keepdims=True) - scores ** 2 * in_cohort) / count
+                std = np.sqrt(np.maximum(mean_sq - mean ** 2, np.finfo(float).eps ** 2))
+                scores = (scores - mean) / std
+        return scores
+    
+    def _shares_ubm_components(self, model, ubm=None):
+        """True when a user's model was MAP-adapted from the current UBM (or `ubm`).
+        
+        MAP adaptation keeps the UBM's variances, so component k of the user
+        model corresponds to component k of the UBM.
+        """
+        if ubm is None:
+            if not self.use_ubm or self.load_ubm() is None:
+                return False
+            ubm = self.ubm
+        return (model.n_components == ubm.n_components and
+                np.array_equal(model.precisions, ubm.precisions))
+    
+    def _fast_llr_frames(self, model, features):
+        """Per-frame likelihood ratios using top-C Gaussian selection.
         
-        return is_verified, log_likelihood
+        The UBM is evaluated in full to pick each frame's top_c components;
+        the user model is evaluated on those components only.
+        """
+        ubm_log_prob, indices = self.ubm.top_components(features, self.top_c)
+        ubm_frames = np.take_along_axis(ubm_log_prob, indices, axis=1)
+        user_frames = model.selected_log_prob(features, indices)
+        return logsumexp(user_frames, axis=1) - logsumexp(ubm_frames, axis=1)
     
     def delete_model(self, user_id):
         """Delete a user's voice model."""
-        if user_id in self.models:
-            del self.models[user_id]
+        self._invalidate_banks()
+        self.models.pop(user_id)
+        self.stats.pop(user_id, None)
+        self.bank.delete(user_id)
+        if self.prefilter_bank is not None:
+            self.prefilters.pop(user_id)
+            self.prefilter_bank.delete(user_id)
+        shutil.rmtree(self._history_dir(user_id), ignore_errors=True)
         
-        model_path = os.path.join(self.models_dir, f"{user_id}_model.joblib")
-        if os.path.exists(model_path):
-            os.remove(model_path)
+        for path in self._legacy_paths(user_id):
+            if os.path.exists(path):
+                os.remove(path)
     
     def list_users(self):
         """List all enrolled users."""
-        return list(self.models.keys()) 
\ No newline at end of file
+        suffix = "_model.joblib"
+        legacy = [name[:-len(suffix)] for name in os.listdir(self.models_dir) if name.endswith(suffix)]
+        return sorted(set(self.bank.user_ids()) | set(legacy))
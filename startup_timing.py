@@ -0,0 +1,70 @@
+import subprocess
+import sys
+import threading
+import time
+
+# Reference point for every mark; import this module first to get the closest
+# approximation of process start
+PROCESS_START = time.perf_counter()
+
+# Heavy modules that are loaded lazily on first voice use or by preloading
+HEAVY_MODULES = ["numpy", "sklearn.mixture", "sklearn.preprocessing", "joblib", "sounddevice", "librosa"]
+
+_lock = threading.Lock()
+_marks = []
+_imports = []
+
+def mark(name):
+    """Record a named startup milestone, in seconds since process start."""
+    elapsed = time.perf_counter() - PROCESS_START
+    with _lock:
+        _marks.append((name, elapsed))
+    return elapsed
+
+def timed_import(module_name):
+    """Import a module and record how long it took (0 if already imported)."""
+    start = time.perf_counter()
+    module = __import__(module_name, fromlist=["_"])
+    with _lock:
+        _imports.append((module_name, time.perf_counter() - start))
+    return module
+
+def measure_cold_imports(modules=None):
+    """Time each module's import in a fresh interpreter, so cold costs are not hidden by shared deps."""
+    results = []
+    for module_name in modules or HEAVY_MODULES:
+        code = (
+            "import time; start = time.perf_counter(); "
+            f"import {module_name}; print(time.perf_counter() - start)"
+        )
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        seconds = float(proc.stdout.strip()) if proc.returncode == 0 else None
+        results.append((module_name, seconds))
+    return results
+
+def report():
+    """Return the startup timing report as text."""
+    with _lock:
+        marks = list(_marks)
+        imports = list(_imports)
+    
+    lines = ["=== Startup Timing ==="]
+    for name, elapsed in marks:
+        lines.append(f"{name:<28} {elapsed * 1000:9.1f} ms")
+    if imports:
+        lines.append("--- Imports ---")
+        for module_name, seconds in imports:
+            lines.append(f"{module_name:<28} {seconds * 1000:9.1f} ms")
+    return "\n".join(lines)
+
+def print_report():
+    """Print the startup timing report."""
+    print(report())
+
+if __name__ == "__main__":
+    print("=== Cold import time per module ===")
+    for module_name, seconds in measure_cold_imports(HEAVY_MODULES + ["main", "gui"]):
+        if seconds is None:
+            print(f"{module_name:<28}    failed")
+        else:
+            print(f"{module_name:<28} {seconds * 1000:9.1f} ms")
@@ -0,0 +1,117 @@
+import numpy as np
+from gmm_scoring import DiagGMMScorer, logsumexp
+
+class StreamingGMMTrainer:
+    """EM for diagonal GMMs over feature chunks that never need to be stacked.
+    
+    Each iteration streams the chunks once, accumulating per-component
+    zeroth, first and second order statistics, then re-estimates weights,
+    means and variances from them. Memory is bounded by the largest chunk.
+    Training stops when the average log-likelihood gains less than `tol`
+    per iteration. With `subsample`, each iteration uses a fresh random
+    fraction of every chunk's frames.
+    """
+    
+    def __init__(self, n_components=16, max_iter=100, tol=1e-3, subsample=None, reg_covar=1e-6,
+                 init_frames=20000, random_state=42):
+        self.n_components = n_components
+        self.max_iter = max_iter
+        self.tol = tol
+        self.subsample = subsample  # Fraction of frames used per iteration (None: all)
+        self.reg_covar = reg_covar  # Added to variances, as in GaussianMixture
+        self.init_frames = init_frames  # Sample size for the initial model
+        self.random_state = random_state
+        self.n_iter_ = 0
+        self.converged_ = False
+        self.lower_bound_ = -np.inf  # Average per-frame log-likelihood of the last iteration
+        
+    @staticmethod
+    def _chunks(source):
+        """Iterate a source that is either a callable returning chunks or a re-iterable list."""
+        return source() if callable(source) else iter(source)
+    
+    def _initial_model(self, source, rng):
+        """Fit a small GMM on a uniform random sample of frames drawn in one pass."""
+        from sklearn.mixture import GaussianMixture
+        
+        # Keep the frames with the smallest random keys: a uniform sample without knowing the total
+        sample, keys = None, None
+        for chunk in self._chunks(source):
+            chunk_keys = rng.random(len(chunk))
+            sample = chunk if sample is None else np.vstack([sample, chunk])
+            keys = chunk_keys if keys is None else np.concatenate([keys, chunk_keys])
+            if len(sample) > self.init_frames:
+                keep = np.argpartition(keys, self.init_frames - 1)[:self.init_frames]
+                sample, keys = sample[keep], keys[keep]
+        if sample is None:
+            raise ValueError("No training frames")
+        
+        gmm = GaussianMixture(n_components=self.n_components, covariance_type='diag', max_iter=20,
+                              reg_covar=self.reg_covar, random_state=self.random_state)
+        gmm.fit(sample)
+        return DiagGMMScorer.from_gmm(gmm)
+    
+    def fit(self, source, init=None, on_progress=None):
+        """Train on `source` and return the model as a DiagGMMScorer.
+        
+        `source` is a list of (n_frames, n_features) arrays or a callable
+        returning a fresh iterator of them, since it is read once per
+        iteration. `init` warm-starts from an existing model (e.g. the
+        current UBM); otherwise the model is initialized from a random
+        sample of frames. `on_progress(iteration, log_likelihood)` is
+        called after each iteration and may raise to abort.
+        """
+        if not callable(source) and iter(source) is source:
+            raise TypeError("source is a one-shot iterator (e.g. a generator) but is read once per "
+                            "iteration; pass a list or a callable returning a fresh iterator")
+        rng = np.random.default_rng(self.random_state)
+        model = init if init is not None else self._initial_model(source, rng)
+        weights, means, precisions = model.weights, model.means, model.precisions
+        
+        self.converged_ = False
+        self.lower_bound_ = -np.inf
+        for iteration in range(1, self.max_iter + 1):
+            scorer = DiagGMMScorer(weights, means, precisions)
+            counts = np.zeros(len(weights))
+            first = np.zeros_like(means)
+            second = np.zeros_like(means)
+            total_log_likelihood, n_frames = 0.0, 0
+            
+            for chunk in self._chunks(source):
+                if self.subsample is not None:
+                    chunk = chunk[rng.random(len(chunk)) < self.subsample]
+                if not len(chunk):
+                    continue
+                # E-step on this chunk only
+                log_prob = scorer.component_log_prob(chunk)
+                frame_log_likelihood = logsumexp(log_prob, axis=1)
+                responsibilities = np.exp(log_prob - frame_log_likelihood[:, None])
+                counts += responsibilities.sum(axis=0, dtype=np.float64)
+                first += responsibilities.T @ chunk
+                second += responsibilities.T @ (chunk * chunk)
+                total_log_likelihood += frame_log_likelihood.sum(dtype=np.float64)
+                n_frames += len(chunk)
+            
+            if not n_frames:
+                raise ValueError("No training frames")
+            
+            # M-step from the accumulated statistics; empty components keep their parameters
+            used = counts > 10 * np.finfo(float).eps
+            safe_counts = np.where(used, counts, 1)[:, None]
+            new_means = np.where(used[:, None], first / safe_counts, means)
+            variances = second / safe_counts - new_means ** 2 + self.reg_covar
+            precisions = np.where(used[:, None], 1 / np.maximum(variances, self.reg_covar), precisions)
+            means = new_means
+            weights = (counts + 10 * np.finfo(float).eps) / (counts.sum() + 10 * np.finfo(float).eps * len(counts))
+            
+            log_likelihood = total_log_likelihood / n_frames
+            gain = log_likelihood - self.lower_bound_
+            self.lower_bound_ = log_likelihood
+            self.n_iter_ = iteration
+            if on_progress is not None:
+                on_progress(iteration, log_likelihood)
+            if abs(gain) < self.tol:
+                self.converged_ = True
+                break
+        
+        return DiagGMMScorer(weights, means, precisions)
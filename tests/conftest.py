@@ -0,0 +1,80 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def random_gmm(rng, n_components=4, n_features=3):
+    """Random diagonal GMM parameters (weights, means, precisions)."""
+    weights = rng.dirichlet(np.ones(n_components))
+    means = rng.normal(size=(n_components, n_features))
+    precisions = rng.uniform(0.5, 2.0, size=(n_components, n_features))
+    return weights, means, precisions
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def speaker_utterance(speaker, session, sr=16000, duration=2.0):
+    """A synthetic voiced recording: the speaker fixes pitch and timbre, the session the variation and noise."""
+    voice = np.random.default_rng(speaker)
+    f0 = voice.uniform(90, 220)
+    harmonics = voice.uniform(0.05, 0.4, size=6)
+    rng = np.random.default_rng(1000 * speaker + session + 1)
+    t = np.arange(int(sr * duration)) / sr
+    pitch = f0 * (1 + 0.03 * rng.standard_normal()) * (1 + 0.04 * np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    y = sum(a * np.sin((h + 1) * phase) for h, a in enumerate(harmonics))
+    y *= 1 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 4) * t + rng.uniform(0, 2 * np.pi))
+    return (y + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+@pytest.fixture(scope="session")
+def processor():
+    from voice_processor import VoiceProcessor
+    return VoiceProcessor()
+
+
+@pytest.fixture(scope="session")
+def utterance_features(processor):
+    """Unscaled features of speaker_utterance(speaker, session)."""
+    def features(speaker, session):
+        return processor.extract_features_from_array(speaker_utterance(speaker, session), 16000)
+    return features
+
+
+def enroll(verifier, user_id, files):
+    """Train a user from per-file features the way enrollment does; returns the stats to verify with."""
+    from voice_processor import RunningStats
+    stats = RunningStats()
+    for features in files:
+        stats.update(features)
+    pooled = np.concatenate([stats.transform(features) for features in files])
+    verifier.train_model(user_id, pooled, stats, lengths=[len(features) for features in files])
+    return verifier.get_stats(user_id)
+
+
+def write_wav(path, y, sr=16000):
+    """Write a mono 16-bit PCM WAV, the format AudioRecorder produces."""
+    import wave
+    with wave.open(str(path), 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes((np.clip(y, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    """Enrollment recordings for three speakers (alice, bob, carol), three sessions each."""
+    recordings_dir = tmp_path / "recordings"
+    recordings_dir.mkdir()
+    for speaker, user_id in enumerate(['alice', 'bob', 'carol']):
+        for session in range(3):
+            write_wav(recordings_dir / f"{user_id}_enroll_{session + 1}.wav", speaker_utterance(speaker, session))
+    return recordings_dir
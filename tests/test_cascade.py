@@ -0,0 +1,30 @@
+import pytest
+
+from conftest import enroll
+from speaker_verifier import SpeakerVerifier
+
+
+@pytest.fixture(params=['em', 'map'])
+def verifier(request, tmp_path, utterance_features):
+    verifier = SpeakerVerifier(models_dir=str(tmp_path / "models"), cascade=True, use_ubm=request.param == 'map')
+    if request.param == 'map':
+        verifier.train_ubm([utterance_features(speaker, 0) for speaker in range(10, 40)])
+    return verifier
+
+
+def test_held_out_genuine_recordings_pass_prefilter(verifier, utterance_features):
+    stats = enroll(verifier, 'alice', [utterance_features(0, session) for session in range(3)])
+    
+    for session in range(3, 8):
+        features = stats.transform(utterance_features(0, session))
+        assert not verifier._prefilter_rejects('alice', features)
+        
+        
+def test_prefilter_rejects_other_speakers(tmp_path, utterance_features):
+    verifier = SpeakerVerifier(models_dir=str(tmp_path / "models"), cascade=True)
+    stats = enroll(verifier, 'alice', [utterance_features(0, session) for session in range(3)])
+    
+    rejects = [verifier._prefilter_rejects('alice', stats.transform(utterance_features(speaker, 0)))
+               for speaker in range(5, 10)]
+    assert any(rejects)
+    assert verifier.cascade_stats()['prefilter_rejects'] == sum(rejects)
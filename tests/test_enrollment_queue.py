@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from enrollment_queue import EnrollmentCancelled, EnrollmentQueue
+from speaker_verifier import SpeakerVerifier
+
+
+@pytest.fixture
+def verifier(tmp_path):
+    return SpeakerVerifier(n_components=4, models_dir=str(tmp_path / "models"))
+
+
+@pytest.fixture
+def queue(processor, verifier):
+    queue = EnrollmentQueue(processor, verifier)
+    yield queue
+    queue.shutdown()
+
+
+def samples(recordings, user_id):
+    return sorted(str(path) for path in recordings.glob(f"{user_id}_enroll_*.wav"))
+
+
+def test_progress_events_in_order(queue, verifier, recordings):
+    seen = []
+    job = queue.submit('alice', samples(recordings, 'alice'),
+                       on_progress=lambda job, stage, done, total: seen.append(stage))
+    model = job.wait(timeout=60)
+    
+    stages = [stage for i, (stage, _, _) in enumerate(job.events) if i == 0 or job.events[i - 1][0] != stage]
+    assert stages == ['queued', 'extraction', 'em', 'saving', 'done']
+    assert job.events[1] == ('extraction', 0, 3) and job.events[2] == ('extraction', 3, 3)
+    assert seen == [stage for stage, _, _ in job.events]
+    assert job.status == 'done' and job.progress == ('done', 1, 1)
+    assert model is not None and 'alice' in verifier.bank
+
+
+def test_cancel_stops_before_saving(queue, verifier, recordings):
+    def cancel_during_training(job, stage, done, total):
+        if stage == 'em':
+            job.cancel()
+            
+    job = queue.submit('alice', samples(recordings, 'alice'), on_progress=cancel_during_training)
+    with pytest.raises(EnrollmentCancelled):
+        job.wait(timeout=60)
+    assert job.cancelled()
+    assert 'saving' not in [stage for stage, _, _ in job.events]
+    assert 'alice' not in verifier.bank
+    assert verifier.get_stats('alice') is None
+
+
+def test_wait_raises_the_training_error(queue, verifier, recordings, monkeypatch):
+    def failing(user_id, features, stats=None, on_progress=None, lengths=None):
+        raise ValueError("Not enough speech")
+    monkeypatch.setattr(verifier, 'train_model', failing)
+    
+    job = queue.submit('alice', samples(recordings, 'alice'))
+    with pytest.raises(ValueError, match="Not enough speech") as raised:
+        job.wait(timeout=60)
+    assert raised.value is job.error
+    assert job.status == 'failed'
+    assert job.done() and not job.cancelled()
+
+
+def test_jobs_run_concurrently(processor, verifier, recordings):
+    both_running = threading.Barrier(2, timeout=30)
+    
+    class BarrierProcessor:
+        """Holds each extraction until the other job is extracting too."""
+        def process_enrollment_samples(self, *args, **kwargs):
+            both_running.wait()
+            return processor.process_enrollment_samples(*args, **kwargs)
+    
+    queue = EnrollmentQueue(BarrierProcessor(), verifier, max_workers=2)
+    try:
+        jobs = [queue.submit(user_id, samples(recordings, user_id)) for user_id in ('alice', 'bob')]
+        for job in jobs:
+            job.wait(timeout=60)
+    finally:
+        queue.shutdown()
+    assert sorted(verifier.list_users()) == ['alice', 'bob']
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from conftest import enroll
+from evaluate import deployed_scores, equal_error_rate, error_rates, min_dcf, threshold_at_far
+from speaker_verifier import SpeakerVerifier
+
+# Thresholds -inf, 1, 2, 3, 3.5, 4, 5, 6, 7 give
+# FRR 0, 0, 0, .25, .25, .5, .75, 1, 1 and FAR 1, .75, .5, .5, .25, .25, .25, .25, 0
+GENUINE = [3.0, 4.0, 5.0, 6.0]
+IMPOSTOR = [1.0, 2.0, 3.5, 7.0]
+
+
+def test_error_rates():
+    thresholds, frr, far = error_rates(GENUINE, IMPOSTOR)
+    np.testing.assert_array_equal(thresholds, [-np.inf, 1, 2, 3, 3.5, 4, 5, 6, 7])
+    np.testing.assert_array_equal(frr, [0, 0, 0, .25, .25, .5, .75, 1, 1])
+    np.testing.assert_array_equal(far, [1, .75, .5, .5, .25, .25, .25, .25, 0])
+
+
+def test_equal_error_rate():
+    assert equal_error_rate(*error_rates(GENUINE, IMPOSTOR)) == (0.25, 3.5)
+    # Separable scores have no errors at the last impostor score
+    assert equal_error_rate(*error_rates([2.0, 3.0], [0.0, 1.0])) == (0.0, 1.0)
+
+
+@pytest.mark.parametrize('p_target, expected', [(0.5, (0.5, 2.0)), (0.01, (1.0, 7.0))])
+def test_min_dcf(p_target, expected):
+    # Normalized cost is FRR + FAR at p_target=0.5, and FRR + 99 FAR at 0.01
+    dcf, threshold = min_dcf(*error_rates(GENUINE, IMPOSTOR), p_target=p_target)
+    assert dcf == pytest.approx(expected[0]) and threshold == expected[1]
+
+
+@pytest.mark.parametrize('target, expected', [(0.0, 7.0), (0.25, 3.5), (0.5, 2.0), (1.0, -np.inf)])
+def test_threshold_at_far(target, expected):
+    thresholds, _, far = error_rates(GENUINE, IMPOSTOR)
+    assert threshold_at_far(thresholds, far, target) == expected
+
+
+def test_deployed_scores_match_batched_full_scoring(tmp_path, utterance_features):
+    verifier = SpeakerVerifier(use_ubm=True, models_dir=str(tmp_path / "models"))
+    verifier.train_ubm([utterance_features(speaker, 0) for speaker in range(10, 40)])
+    for speaker, user_id in enumerate(['alice', 'bob', 'carol']):
+        enroll(verifier, user_id, [utterance_features(speaker, session) for session in range(3)])
+    utterances = [utterance_features(speaker, 7) for speaker in range(3)]
+
+    user_ids, scores = deployed_scores(verifier, utterances)
+    expected_ids, expected = verifier.score_matrix(utterances)
+    assert user_ids == expected_ids
+    np.testing.assert_allclose(scores, expected, rtol=1e-4, atol=1e-4)
+
+    # Top-C scoring stays on the same scale
+    verifier.top_c = 5
+    np.testing.assert_allclose(deployed_scores(verifier, utterances)[1], expected, atol=0.05)
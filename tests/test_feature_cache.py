@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import speaker_utterance, write_wav
+from feature_cache import FeatureCache
+from voice_processor import VoiceProcessor
+
+
+@pytest.fixture
+def wav(tmp_path):
+    path = tmp_path / "alice_enroll_1.wav"
+    write_wav(path, speaker_utterance(0, 0))
+    return str(path)
+
+
+def entry(value, n=100):
+    return np.full(n, value, dtype=np.float64)  # 800 bytes of data plus the .npy header
+
+
+def test_hits_and_misses(tmp_path, wav):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    processor = VoiceProcessor(cache=cache)
+
+    first = processor.extract_features(wav)
+    second = processor.extract_features(wav)
+    np.testing.assert_array_equal(first, second)
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    assert cache.stats()['entries'] == 1
+
+
+def test_evicts_least_recently_used_under_max_bytes(tmp_path):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    cache.put('a', entry(1))
+    size = cache.bytes_stored
+    cache.max_bytes = 2 * size
+    cache.put('b', entry(2))
+    assert cache.get('a') is not None
+
+    cache.put('c', entry(3))
+    assert cache.get('b') is None
+    assert not os.path.exists(os.path.join(cache.cache_dir, "b.npy"))
+    assert cache.stats()['evictions'] == 1 and cache.bytes_stored == 2 * size
+    np.testing.assert_array_equal(cache.get('a'), entry(1))
+
+
+def test_lru_order_is_rebuilt_from_mtimes(tmp_path):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    for key, mtime in (('a', 300), ('b', 100), ('c', 200)):
+        cache.put(key, entry(0))
+        os.utime(os.path.join(cache.cache_dir, f"{key}.npy"), (mtime, mtime))
+    size = cache.bytes_stored // 3
+
+    restarted = FeatureCache(cache.cache_dir, max_bytes=2 * size)
+    assert list(restarted._entries) == ['c', 'a']
+    assert restarted.stats()['evictions'] == 1
+    assert not os.path.exists(os.path.join(cache.cache_dir, "b.npy"))
+
+
+@pytest.mark.parametrize('changed', [{'n_mfcc': 20}, {'vad': False}, {'vad_top_db': 30.0}, {'vad_floor_db': 3.0},
+                                     {'dtype': np.float32}])
+def test_key_changes_with_extractor_parameters(tmp_path, wav, changed):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    base = VoiceProcessor(cache=cache)
+    other = VoiceProcessor(cache=cache, **changed)
+    assert cache.key_for_file(wav, base._cache_params()) != cache.key_for_file(wav, other._cache_params())
+
+    base.extract_features(wav)
+    features = other.extract_features(wav)
+    assert cache.stats()['misses'] == 2
+    np.testing.assert_array_equal(features, other.extract_features(wav))
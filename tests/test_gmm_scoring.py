@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from gmm_scoring import CompactGMM, DiagGMMScorer
+from voice_processor import RunningStats
+
+
+@pytest.fixture(scope="module")
+def trained(utterance_features):
+    from sklearn.mixture import GaussianMixture
+    
+    files = [utterance_features(0, session) for session in range(3)]
+    stats = RunningStats()
+    for features in files:
+        stats.update(features)
+    gmm = GaussianMixture(n_components=16, covariance_type='diag', random_state=42)
+    gmm.fit(np.concatenate([stats.transform(features) for features in files]))
+    return DiagGMMScorer.from_gmm(gmm), stats.transform(utterance_features(0, 5))
+
+
+@pytest.mark.parametrize('dtype, tolerance', [('float16', 0.01), ('int8', 0.25)])
+def test_compact_score_error_is_small(trained, dtype, tolerance):
+    model, features = trained
+    compact = CompactGMM.from_scorer(model, dtype)
+    
+    assert compact.nbytes < model.nbytes / 2
+    # Average per-frame log-likelihood, in nats
+    assert abs(compact.score(features) - model.score(features)) < tolerance
+
+
+def test_shared_precisions_are_not_copied(trained):
+    model, features = trained
+    compact = CompactGMM.from_scorer(model, 'int8', shared_precisions=model.precisions)
+    
+    assert compact.precisions is model.precisions
+    assert compact.nbytes < CompactGMM.from_scorer(model, 'int8').nbytes
+    assert abs(compact.score(features) - model.score(features)) < 0.25
+
+
+def test_nbytes_does_not_grow_after_float32_scoring(trained):
+    from model_cache import ModelCache
+    
+    model, features = trained
+    model = DiagGMMScorer(model.weights, model.means, model.precisions)
+    cache = ModelCache(max_bytes=10 ** 6)
+    cache['alice'] = model
+    before = model.nbytes
+    
+    model.score(features.astype(np.float32))
+    model.score(features)
+    assert model.nbytes == before == cache.bytes_resident
+    held = [array for array in vars(model).values() if isinstance(array, np.ndarray)]
+    held += [array for cast in model._cast.values() for array in cast]
+    assert model.nbytes == sum(array.nbytes for array in held)
+
+
+@pytest.mark.parametrize('chunk_size', [None, 7])
+@pytest.mark.parametrize('dtype', ['float64', 'float32'])
+def test_scorer_matches_gaussian_mixture(utterance_features, chunk_size, dtype):
+    from sklearn.mixture import GaussianMixture
+    
+    train = np.concatenate([utterance_features(0, session) for session in range(3)])
+    stats = RunningStats().update(train)
+    gmm = GaussianMixture(n_components=8, covariance_type='diag', random_state=0).fit(stats.transform(train))
+    scorer = DiagGMMScorer.from_gmm(gmm, chunk_size=chunk_size)
+    
+    features = stats.transform(utterance_features(1, 0))
+    expected = gmm.score_samples(features)
+    rtol = 1e-10 if dtype == 'float64' else 1e-4
+    np.testing.assert_allclose(scorer.score_samples(features.astype(dtype)), expected, rtol=rtol)
+    assert scorer.score(features.astype(dtype)) == pytest.approx(gmm.score(features), rel=rtol)
+    np.testing.assert_allclose(scorer.predict_proba(features), gmm.predict_proba(features), atol=1e-8)
@@ -0,0 +1,135 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import random_gmm
+from model_bank import ModelBank
+
+
+@pytest.fixture
+def bank(tmp_path):
+    return ModelBank(str(tmp_path / "bank"), initial_capacity=4)
+
+
+@pytest.fixture
+def rewrites(monkeypatch):
+    """Count full rewrites of the bank's arrays."""
+    calls = []
+    rewrite = ModelBank._rewrite
+    
+    def counting(self, capacity, rows):
+        calls.append(capacity)
+        return rewrite(self, capacity, rows)
+    monkeypatch.setattr(ModelBank, '_rewrite', counting)
+    return calls
+
+
+def fill(bank, rng, user_ids):
+    params = {user_id: random_gmm(rng) for user_id in user_ids}
+    for user_id, (weights, means, precisions) in params.items():
+        bank.put(user_id, weights, means, precisions, role='user')
+    return params
+
+
+def test_freed_row_is_reused(bank, rng):
+    fill(bank, rng, ['a', 'b', 'c'])
+    row = bank.index['rows']['b']
+    bank.delete('b')
+    fill(bank, rng, ['d'])
+    assert bank.index['rows']['d'] == row
+    assert bank.index['capacity'] == 4
+    assert bank.index['free'] == []
+
+
+def test_delete_on_partly_filled_bank_does_not_compact(tmp_path, rng, rewrites):
+    bank = ModelBank(str(tmp_path / "bank"), initial_capacity=64)
+    fill(bank, rng, [f"u{i}" for i in range(129)])
+    assert bank.index['capacity'] == 256
+    del rewrites[:]
+    
+    bank.delete('u0')
+    bank.delete('u1')
+    fill(bank, rng, ['new'])
+    assert bank.index['capacity'] == 256
+    assert rewrites == []
+
+
+def test_compaction_keeps_headroom(tmp_path, rng, rewrites):
+    bank = ModelBank(str(tmp_path / "bank"), initial_capacity=4)
+    params = fill(bank, rng, [f"u{i}" for i in range(20)])
+    del rewrites[:]
+    
+    for i in range(11):
+        bank.delete(f"u{i}")
+    assert rewrites == [18]
+    assert sorted(bank.index['rows'].values()) == list(range(9))
+    for user_id in bank.user_ids():
+        for stored, expected in zip(bank.get(user_id), params[user_id]):
+            np.testing.assert_allclose(stored, expected)
+    
+    # Room to grow again without another rewrite
+    fill(bank, rng, [f"v{i}" for i in range(9)])
+    assert rewrites == [18]
+
+
+def test_index_changes_survive_reopen(bank, rng, tmp_path):
+    params = fill(bank, rng, ['a', 'b', 'c'])
+    bank.update_meta('a', version=2)
+    bank.delete('b')
+    bank.close()
+    
+    reopened = ModelBank(bank.bank_dir, initial_capacity=4)
+    assert reopened.index == bank.index
+    assert reopened.get_meta('a')['version'] == 2
+    np.testing.assert_allclose(reopened.get('c')[1], params['c'][1])
+
+
+def test_puts_append_to_the_journal(bank, rng):
+    fill(bank, rng, ['a'])  # Grows the files, which writes index.json
+    with open(os.path.join(bank.bank_dir, "index.json")) as f:
+        snapshot = f.read()
+    fill(bank, rng, ['b', 'c'])
+    bank.update_meta('b', version=2)
+    
+    with open(os.path.join(bank.bank_dir, "index.json")) as f:
+        assert f.read() == snapshot
+    with open(os.path.join(bank.bank_dir, "index.journal")) as f:
+        assert [json.loads(line)['user_id'] for line in f] == ['a', 'b', 'c', 'b']
+
+
+def test_journal_is_folded_into_the_index(tmp_path, rng):
+    bank = ModelBank(str(tmp_path / "bank"), initial_capacity=256)
+    fill(bank, rng, [f"u{i}" for i in range(200)])
+    assert bank._journal_len <= 200
+    assert ModelBank(bank.bank_dir).index == bank.index
+
+
+def test_torn_journal_entry_is_dropped(bank, rng):
+    fill(bank, rng, ['a', 'b'])
+    with open(os.path.join(bank.bank_dir, "index.journal"), 'a') as f:
+        f.write('{"op": "set", "user_id": "c", "ro')
+    
+    reopened = ModelBank(bank.bank_dir)
+    assert reopened.user_ids() == ['a', 'b']
+    assert not os.path.exists(os.path.join(bank.bank_dir, "index.journal"))
+    fill(reopened, rng, ['c'])
+    assert ModelBank(bank.bank_dir).user_ids() == ['a', 'b', 'c']
+
+
+def test_index_without_next_row_is_migrated(bank, rng):
+    fill(bank, rng, ['a', 'b', 'c'])
+    bank.delete('b')
+    bank.close()
+    
+    # The old layout listed never-used rows as free too
+    index = dict(bank.index, free=[3, 1])
+    del index['next_row'], index['seq']
+    with open(os.path.join(bank.bank_dir, "index.json"), 'w') as f:
+        json.dump(index, f)
+    os.remove(os.path.join(bank.bank_dir, "index.journal"))
+    
+    migrated = ModelBank(bank.bank_dir)
+    assert migrated.index['free'] == [1]
+    assert migrated.index['next_row'] == 3
@@ -0,0 +1,40 @@
+import numpy as np
+
+from model_cache import ModelCache
+
+
+def test_evicts_least_recently_used():
+    cache = ModelCache(max_entries=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache.get('a')
+    cache['c'] = 3
+    assert cache.keys() == ['a', 'c']
+    assert cache.evictions == 1
+
+
+def test_touch_reorders_without_counting_a_hit():
+    cache = ModelCache(max_entries=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.touch('a')
+    assert not cache.touch('missing')
+    cache['c'] = 3
+    assert cache.keys() == ['a', 'c']
+    assert cache.hits == 0
+
+
+def test_byte_budget_and_pinning():
+    evicted = []
+    cache = ModelCache(max_bytes=200, on_evict=evicted.append)
+    cache['a'] = np.zeros(10)  # 80 bytes
+    cache.pin('a')
+    cache['b'] = np.zeros(10)
+    cache['c'] = np.zeros(10)
+    assert evicted == ['b']
+    assert set(cache.keys()) == {'a', 'c'}
+    assert cache.bytes_resident == 160
+    
+    cache.pop('a')
+    assert cache.stats()['pinned'] == 0
+    assert cache.bytes_resident == 80
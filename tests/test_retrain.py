@@ -0,0 +1,84 @@
+import numpy as np
+
+from conftest import enroll, random_gmm
+from main import find_enrollment_recordings
+from retrain import retrain
+from speaker_verifier import SpeakerVerifier
+
+
+def enroll_live(models_dir, recordings, processor):
+    live = SpeakerVerifier(n_components=8, use_ubm=True, cascade=True, models_dir=models_dir)
+    files = find_enrollment_recordings(str(recordings))
+    live.train_ubm(processor.extract_features_batch(files['alice']))
+    for user_id, paths in files.items():
+        enroll(live, user_id, processor.extract_features_batch(paths))
+    # A user without recordings, who keeps their model but not their pre-filter
+    live.bank.put('dave', *random_gmm(np.random.default_rng(1), 8, live.ubm.means.shape[1]))
+    live.prefilter_bank.put('dave', *random_gmm(np.random.default_rng(2), 4, live.ubm.means.shape[1]),
+                            reject_below=0.0)
+    live.bank.close()
+    live.prefilter_bank.close()
+    return live
+
+
+def test_retrain_installs_fresh_prefilters(tmp_path, recordings, processor):
+    models_dir = str(tmp_path / "models")
+    live = enroll_live(models_dir, recordings, processor)
+    old_small_ubm = live.load_prefilter_ubm()
+    
+    assert retrain(str(recordings), models_dir, workers=1, n_components=8, dtype="float64", cache_dir=None) == 3
+    
+    installed = SpeakerVerifier(n_components=8, use_ubm=True, cascade=True, models_dir=models_dir)
+    assert sorted(installed.list_users()) == ['alice', 'bob', 'carol', 'dave']
+    assert sorted(installed.prefilter_bank.user_ids()) == ['alice', 'bob', 'carol']
+    small_ubm = installed.load_prefilter_ubm()
+    assert not np.allclose(small_ubm.means, old_small_ubm.means)
+    for user_id in ['alice', 'bob', 'carol']:
+        # Adapted from the installed small UBM
+        assert np.array_equal(installed.prefilter_bank.get(user_id)[2], small_ubm.precisions)
+
+
+def test_retrain_without_cascade_removes_prefilters(tmp_path, recordings, processor):
+    models_dir = tmp_path / "models"
+    enroll_live(str(models_dir), recordings, processor)
+    
+    retrain(str(recordings), str(models_dir), workers=1, n_components=8, dtype="float64", cache_dir=None,
+            cascade=False)
+    
+    assert not (models_dir / "prefilter").exists()
+    assert not (models_dir / "ubm_prefilter.npz").exists()
+
+
+def test_interrupted_retrain_resumes(tmp_path, recordings, processor):
+    models_dir = tmp_path / "models"
+    enroll_live(str(models_dir), recordings, processor)
+    broken = recordings / "carol_enroll_2.wav"
+    audio = broken.read_bytes()
+    broken.write_bytes(b"not a recording")
+    
+    assert retrain(str(recordings), str(models_dir), workers=1, n_components=8, dtype="float64", cache_dir=None) == 2
+    assert not (models_dir / "bank.previous").exists()
+    assert sorted(SpeakerVerifier(models_dir=str(models_dir / "retrain")).list_users()) == ['alice', 'bob']
+    
+    broken.write_bytes(audio)
+    assert retrain(str(recordings), str(models_dir), workers=1, n_components=8, dtype="float64", cache_dir=None) == 1
+    assert (models_dir / "bank.previous").exists()
+    assert not (models_dir / "retrain").exists()
+    installed = SpeakerVerifier(models_dir=str(models_dir))
+    assert all(installed.bank.get_meta(user_id).get('retrained') for user_id in ['alice', 'bob', 'carol'])
+
+
+def test_feature_change_refuses_to_drop_users_without_recordings(tmp_path, recordings, processor):
+    models_dir = tmp_path / "models"
+    enroll_live(str(models_dir), recordings, processor)
+    
+    # 20 MFCCs give 60 features; dave's model has 39 and cannot be carried over
+    assert retrain(str(recordings), str(models_dir), workers=1, n_components=8, n_mfcc=20, dtype="float64",
+                   cache_dir=None) == 3
+    assert not (models_dir / "bank.previous").exists()
+    
+    retrain(str(recordings), str(models_dir), workers=1, n_components=8, n_mfcc=20, dtype="float64",
+            cache_dir=None, drop_missing=True)
+    installed = SpeakerVerifier(models_dir=str(models_dir))
+    assert sorted(installed.list_users()) == ['alice', 'bob', 'carol']
+    assert installed.bank.index['n_features'] == 60
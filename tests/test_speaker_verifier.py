@@ -0,0 +1,171 @@
+import numpy as np
+import pytest
+
+from conftest import enroll, random_gmm
+from speaker_verifier import SpeakerVerifier
+
+
+def make_bank(tmp_path, rng, user_ids, **kwargs):
+    verifier = SpeakerVerifier(models_dir=str(tmp_path / "models"), **kwargs)
+    for updated_at, user_id in enumerate(user_ids):
+        verifier.bank.put(user_id, *random_gmm(rng), updated_at=updated_at)
+    return verifier
+
+
+def reopen(verifier, **kwargs):
+    verifier.bank.close()
+    return SpeakerVerifier(models_dir=verifier.models_dir, **kwargs)
+
+
+def test_preload_entry_budget_keeps_most_recent(tmp_path, rng):
+    # Bank order by last update: dave, carol, bob, alice
+    verifier = make_bank(tmp_path, rng, ['alice', 'bob', 'carol', 'dave'])
+    verifier = reopen(verifier, cache_entries=2)
+    
+    assert verifier.preload_models(recent=['alice', 'bob']) == 2
+    assert verifier.models.keys() == ['bob', 'alice']
+    assert verifier.cache_stats()['evictions'] == 0
+    
+    # The next load evicts the least recent of the preloaded users
+    verifier.load_model('carol')
+    assert verifier.models.keys() == ['alice', 'carol']
+
+
+def test_preload_byte_budget_keeps_most_recent(tmp_path, rng):
+    verifier = make_bank(tmp_path, rng, ['alice', 'bob', 'carol', 'dave'])
+    nbytes = verifier.load_model('alice').nbytes
+    verifier = reopen(verifier, cache_bytes=2 * nbytes + nbytes // 2)
+    
+    assert verifier.preload_models(recent=['alice', 'bob']) == 2
+    assert verifier.models.keys() == ['bob', 'alice']
+    assert verifier.cache_stats()['evictions'] == 0
+
+
+def test_preload_keeps_resident_models(tmp_path, rng):
+    verifier = make_bank(tmp_path, rng, ['alice', 'bob', 'carol'])
+    verifier = reopen(verifier, cache_entries=2)
+    verifier.load_model('carol')
+    
+    assert verifier.preload_models(recent=['alice']) == 1
+    assert verifier.models.keys() == ['carol', 'alice']
+    assert verifier.cache_stats()['evictions'] == 0
+
+
+@pytest.mark.parametrize('score_norm', ['znorm', 'tnorm'])
+def test_identify_scores_match_verification(tmp_path, utterance_features, score_norm):
+    verifier = SpeakerVerifier(n_components=4, score_norm=score_norm, models_dir=str(tmp_path / "models"))
+    stats = {}
+    cohort = {}
+    for speaker, user_id in enumerate(['alice', 'bob', 'carol', 'dave']):
+        cohort[user_id] = [utterance_features(speaker, session) for session in range(3)]
+        stats[user_id] = enroll(verifier, user_id, cohort[user_id])
+    if score_norm == 'znorm':
+        assert verifier.compute_znorm(cohort) == 4
+    
+    raw = utterance_features(1, 5)
+    matches = verifier.identify(raw, top_k=4)
+    assert matches[0][0] == 'bob'
+    for user_id, score in matches:
+        _, expected = verifier.verify_speaker(user_id, stats[user_id].transform(raw))
+        assert score == pytest.approx(expected, rel=1e-6, abs=1e-6)
+
+
+def test_adaptation_versions_and_rollback(tmp_path, utterance_features):
+    verifier = SpeakerVerifier(n_components=4, use_ubm=True, score_norm='znorm', adapt_interval=0,
+                               models_dir=str(tmp_path / "models"))
+    verifier.train_ubm([utterance_features(speaker, 0) for speaker in range(10, 20)])
+    cohort = {f"s{speaker}": [utterance_features(speaker, 1)] for speaker in range(10, 14)}
+    cohort['alice'] = [utterance_features(0, session) for session in range(3)]
+    stats = enroll(verifier, 'alice', cohort['alice'])
+    verifier.compute_znorm(cohort, ['alice'])
+    original = verifier.bank.get('alice')
+    znorm = {key: verifier.bank.get_meta('alice')[key] for key in ('znorm_mean', 'znorm_std')}
+    
+    assert verifier.adapt_model('alice', stats.transform(utterance_features(0, 3)), score=1e9) == 2
+    assert verifier.bank.get_meta('alice')['znorm_std'] is None
+    adapted = verifier.bank.get('alice')
+    assert not np.allclose(adapted[1], original[1])
+    assert verifier.adapt_model('alice', stats.transform(utterance_features(0, 4)), score=1e9) == 3
+    assert verifier.model_versions('alice') == [1, 2]
+    
+    assert verifier.rollback_model('alice') == 2
+    np.testing.assert_array_equal(verifier.bank.get('alice')[1], adapted[1])
+    assert verifier.bank.get_meta('alice')['znorm_std'] is None
+    
+    assert verifier.rollback_model('alice', 1) == 1
+    for restored, expected in zip(verifier.bank.get('alice'), original):
+        np.testing.assert_array_equal(restored, expected)
+    np.testing.assert_allclose(verifier.models.get('alice').means, original[1])
+    meta = verifier.bank.get_meta('alice')
+    assert meta['version'] == 1
+    assert {key: meta[key] for key in znorm} == znorm
+    assert verifier.model_versions('alice') == []
+    assert verifier.rollback_model('alice') is None
+
+
+@pytest.mark.parametrize('score_norm', [None, 'tnorm'])
+def test_decisions_are_plain_bools(tmp_path, utterance_features, score_norm):
+    verifier = SpeakerVerifier(n_components=4, score_norm=score_norm, models_dir=str(tmp_path / "models"))
+    for speaker, user_id in enumerate(['alice', 'bob', 'carol', 'dave']):
+        stats = enroll(verifier, user_id, [utterance_features(speaker, session) for session in range(3)])
+    
+    features = stats.transform(utterance_features(3, 5))
+    accepted, score, used = verifier.verify_sequential('dave', features)
+    assert type(accepted) is bool and type(score) is float and 0 < used <= len(features)
+    accepted, score = verifier.verify_speaker('dave', features)
+    assert type(accepted) is bool and type(score) is float
+
+
+@pytest.mark.parametrize('top_c', [None, 5])
+def test_ubm_mode_scores_genuine_above_impostors(tmp_path, utterance_features, top_c):
+    verifier = SpeakerVerifier(use_ubm=True, top_c=top_c, models_dir=str(tmp_path / "models"))
+    verifier.train_ubm([utterance_features(speaker, 0) for speaker in range(10, 40)])
+    user_ids = [f"user{speaker}" for speaker in range(6)]
+    for speaker, user_id in enumerate(user_ids):
+        enroll(verifier, user_id, [utterance_features(speaker, session) for session in range(3)])
+    
+    # Test utterances are scaled with the claimed user's stats, as at verification time
+    scores = np.array([
+        [verifier.verify_speaker(user_id, verifier.get_stats(user_id).transform(utterance_features(speaker, 7)))[1]
+         for speaker in range(6)]
+        for user_id in user_ids])
+    genuine = np.eye(6, dtype=bool)
+    assert (scores.argmax(axis=0) == np.arange(6)).all()
+    assert scores[genuine].mean() > scores[~genuine].mean() + 2
+    assert (scores[genuine] > verifier.llr_threshold).all()
+
+
+def test_znorm_is_not_stored_for_a_replaced_model(tmp_path, utterance_features, monkeypatch):
+    verifier = SpeakerVerifier(n_components=4, score_norm='znorm', models_dir=str(tmp_path / "models"))
+    cohort = {user_id: [utterance_features(speaker, session) for session in range(3)]
+              for speaker, user_id in enumerate(['alice', 'bob', 'carol'])}
+    for user_id, files in cohort.items():
+        enroll(verifier, user_id, files)
+    
+    # Alice's model is replaced (as by adapt_model) while her impostor scores are computed
+    frame_scores = verifier._frame_scores
+    
+    def replacing(model, features, fast=True):
+        verifier.bank.update_meta('alice', version=2)
+        return frame_scores(model, features, fast)
+    monkeypatch.setattr(verifier, '_frame_scores', replacing)
+    
+    assert verifier.compute_znorm(cohort, ['alice']) == 0
+    assert verifier.bank.get_meta('alice')['znorm_std'] is None
+
+
+def test_top_c_llr_stays_close_to_full_scoring(tmp_path, utterance_features):
+    verifier = SpeakerVerifier(use_ubm=True, top_c=5, models_dir=str(tmp_path / "models"))
+    verifier.train_ubm([utterance_features(speaker, 0) for speaker in range(10, 40)])
+    stats = enroll(verifier, 'alice', [utterance_features(0, session) for session in range(3)])
+    model = verifier.load_model('alice')
+    
+    for speaker in range(4):
+        features = stats.transform(utterance_features(speaker, 7))
+        fast = verifier._frame_scores(model, features)
+        full = verifier._frame_scores(model, features, fast=False)
+        assert abs(fast.mean() - full.mean()) < 0.01
+        
+    # Selecting every component is exact
+    verifier.top_c = verifier.n_components
+    np.testing.assert_allclose(verifier._frame_scores(model, features), full, atol=1e-9)
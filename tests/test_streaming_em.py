@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from streaming_em import StreamingGMMTrainer
+
+
+@pytest.fixture
+def chunks(rng):
+    centers = np.array([[-4.0, 0.0], [4.0, 0.0]])
+    return [centers[i % 2] + rng.normal(size=(200, 2)) for i in range(6)]
+
+
+def test_one_shot_iterator_is_rejected(chunks):
+    trainer = StreamingGMMTrainer(n_components=2, max_iter=5)
+    with pytest.raises(TypeError):
+        trainer.fit(chunk for chunk in chunks)
+    with pytest.raises(TypeError):
+        trainer.fit(iter(chunks))
+
+
+def test_list_and_callable_sources_agree(chunks):
+    from_list = StreamingGMMTrainer(n_components=2, max_iter=20).fit(chunks)
+    from_callable = StreamingGMMTrainer(n_components=2, max_iter=20).fit(lambda: (chunk for chunk in chunks))
+    np.testing.assert_allclose(from_list.means, from_callable.means)
+    np.testing.assert_allclose(np.sort(from_list.means[:, 0]), [-4, 4], atol=0.3)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from conftest import speaker_utterance, write_wav
+
+
+@pytest.fixture
+def enrollment(tmp_path):
+    paths = []
+    for session, duration in enumerate([1.0, 2.0]):
+        paths.append(str(tmp_path / f"alice_enroll_{session + 1}.wav"))
+        write_wav(paths[-1], speaker_utterance(0, session, duration=duration))
+    return paths
+
+
+def test_verification_requires_the_users_stats(processor, enrollment):
+    # Enrolling someone must not supply the stats for everyone else
+    processor.process_enrollment_samples(enrollment)
+    with pytest.raises(ValueError):
+        processor.process_verification_audio(speaker_utterance(1, 0), 16000, None)
+
+
+def test_enrollment_lengths_match_the_pooled_features(processor, enrollment):
+    features, stats, lengths = processor.process_enrollment_samples(enrollment, return_stats=True,
+                                                                    return_lengths=True)
+    assert sum(lengths) == len(features) == stats.count
+    assert lengths[0] < lengths[1]
+    np.testing.assert_allclose(features.mean(axis=0), 0, atol=1e-6)
+
+
+@pytest.mark.parametrize('dtype, atol', [('float64', 1e-5), ('float32', 1e-3)])
+@pytest.mark.parametrize('n_mfcc', [13, 20])
+def test_mfcc_kernel_matches_librosa(dtype, atol, n_mfcc):
+    import librosa
+    from mfcc_kernel import get_kernel
+    
+    kernel = get_kernel(16000, 2048, n_mfcc, 512, dtype)
+    batch = np.stack([speaker_utterance(0, 0), speaker_utterance(1, 0)]).astype(dtype)
+    batch[1, :4000] = 0  # Leading silence exercises the dB floor
+    features = kernel.features(batch)
+    
+    for y, result in zip(batch, features):
+        mfccs = librosa.feature.mfcc(y=y, sr=16000, n_mfcc=n_mfcc, n_fft=2048, hop_length=512)
+        expected = np.vstack([mfccs, librosa.feature.delta(mfccs), librosa.feature.delta(mfccs, order=2)]).T
+        assert result.dtype == np.dtype(dtype)
+        np.testing.assert_allclose(result, expected, atol=atol)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_batch_extraction_matches_single_files(tmp_path, dtype):
+    from voice_processor import VoiceProcessor
+    processor = VoiceProcessor(dtype=dtype)
+    paths = []
+    for i, duration in enumerate([1.0, 2.0, 1.0, 1.5, 0.5]):
+        paths.append(str(tmp_path / f"user_enroll_{i + 1}.wav"))
+        write_wav(paths[-1], speaker_utterance(i % 2, i, duration=duration))
+
+    batch = processor.extract_features_batch(paths)
+    assert len(batch) == len(paths)
+    for path, features in zip(paths, batch):
+        single = processor.extract_features(path)
+        assert features.shape == single.shape and features.dtype == single.dtype
+        np.testing.assert_allclose(features, single, rtol=1e-5, atol=1e-4 if dtype == np.float32 else 1e-8)
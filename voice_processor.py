@@ -1,57 +1,353 @@
-import librosa
 import numpy as np
 import os
-from sklearn.preprocessing import StandardScaler
+import threading
+import wave
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from mfcc_kernel import get_kernel
+
+# Bump whenever the feature computation changes so cached features are not reused
+FEATURE_VERSION = 2
+
+def load_audio(audio_path):
+    """Load an audio file as mono float32 at its native sample rate.
+    
+    16-bit PCM WAV files (what AudioRecorder writes) are decoded directly;
+    anything else falls back to librosa.
+    """
+    try:
+        with wave.open(audio_path, 'rb') as wf:
+            if wf.getsampwidth() == 2 and wf.getcomptype() == 'NONE':
+                sr = wf.getframerate()
+                channels = wf.getnchannels()
+                data = np.frombuffer(wf.readframes(wf.getnframes()), dtype='<i2')
+                y = data.reshape(-1, channels).mean(axis=1, dtype=np.float32) / 32768.0
+                return y.astype(np.float32), sr
+    except (wave.Error, EOFError):
+        pass
+    
+    import librosa
+    return librosa.load(audio_path, sr=None)
+
+class RunningStats:
+    """Streaming per-dimension mean/variance (Welford, merged per batch with Chan's update)."""
+    
+    def __init__(self, n_features=None):
+        self.count = 0
+        self.mean = None if n_features is None else np.zeros(n_features)
+        self.m2 = None if n_features is None else np.zeros(n_features)
+        
+    def update(self, features):
+        """Fold a (n_frames, n_features) batch into the statistics."""
+        features = np.asarray(features)
+        n = len(features)
+        if n == 0:
+            return self
+        
+        # Accumulate in float64 even when features are float32
+        batch_mean = features.mean(axis=0, dtype=np.float64)
+        batch_m2 = ((features - batch_mean) ** 2).sum(axis=0)
+        if self.count == 0:
+            self.count, self.mean, self.m2 = n, batch_mean, batch_m2
+            return self
+        
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+        return self
+    
+    @property
+    def variance(self):
+        return self.m2 / np.maximum(self.count, 1)
+    
+    @property
+    def scale(self):
+        """Standard deviation, with constant dimensions left unscaled like StandardScaler."""
+        std = np.sqrt(self.variance)
+        return np.where(std < 10 * np.finfo(std.dtype).eps, 1.0, std)
+    
+    def transform(self, features, out=None):
+        """Standardize features with the accumulated mean and scale, keeping their dtype."""
+        dtype = features.dtype if out is None else out.dtype
+        out = np.subtract(features, self.mean.astype(dtype, copy=False), out=out)
+        out /= self.scale.astype(dtype, copy=False)
+        return out
+    
+    def save(self, path):
+        np.savez(path, count=self.count, mean=self.mean, m2=self.m2)
+        
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        stats = cls()
+        stats.count = int(data['count'])
+        stats.mean = data['mean']
+        stats.m2 = data['m2']
+        return stats
+
+def _extract_chunk(params, audio_paths):
+    """Worker entry point: extract features for one chunk of files."""
+    processor = VoiceProcessor(**params)
+    return processor.extract_features_batch(audio_paths)
 
 class VoiceProcessor:
-    def __init__(self, n_mfcc=13, n_fft=2048, hop_length=512):
+    def __init__(self, n_mfcc=13, n_fft=2048, hop_length=512, batch_size=64, cache=None,
+                 vad=True, vad_top_db=40.0, vad_floor_db=6.0, dtype=np.float64):
         self.n_mfcc = n_mfcc
         self.n_fft = n_fft
         self.hop_length = hop_length
-        self.scaler = StandardScaler()
+        self.batch_size = batch_size
+        self.cache = cache  # Optional FeatureCache shared across calls
+        self.vad = vad  # Drop non-speech frames right after feature extraction
+        self.vad_top_db = vad_top_db
+        self.vad_floor_db = vad_floor_db
+        self.last_vad_ratio = 1.0  # Fraction of frames kept by the last extraction
+        self.dtype = np.dtype(dtype)  # float32 halves the footprint of the whole pipeline
+        self._workspace = threading.local()  # Reusable per-thread verification buffers
         
+    def _cache_params(self):
+        """Extractor parameters that make up part of the cache key."""
+        vad = (self.vad_top_db, self.vad_floor_db) if self.vad else None
+        return (self.n_mfcc, self.n_fft, self.hop_length, vad, self.dtype.name, FEATURE_VERSION)
+    
+    def _cache_lookup(self, audio_paths):
+        """Return cached features (or None) and cache keys for each file."""
+        if self.cache is None:
+            return [None] * len(audio_paths), [None] * len(audio_paths)
+        
+        params = self._cache_params()
+        keys = [self.cache.key_for_file(audio_path, params) for audio_path in audio_paths]
+        return [self.cache.get(key) for key in keys], keys
+    
     def extract_features(self, audio_path):
         """Extract MFCC features from an audio file."""
+        cached, keys = self._cache_lookup([audio_path])
+        if cached[0] is not None:
+            return cached[0]
+        
         # Load audio file
-        y, sr = librosa.load(audio_path, sr=None)
+        y, sr = load_audio(audio_path)
+        features = self.extract_features_from_array(y, sr)
+        
+        if self.cache is not None:
+            self.cache.put(keys[0], features)
+        
+        return features
+    
+    def extract_features_from_array(self, y, sr):
+        """Extract MFCC features from an in-memory audio buffer.
+        
+        Accepts the float buffer produced by AudioRecorder (mono or
+        (n_samples, n_channels)) so live recordings skip the WAV round trip.
+        """
+        y = self._as_mono(y)
         
-        # Extract MFCC features
-        mfccs = librosa.feature.mfcc(
-            y=y,
-            sr=sr,
-            n_mfcc=self.n_mfcc,
-            n_fft=self.n_fft,
-            hop_length=self.hop_length
-        )
+        # MFCC, delta and delta-delta features as (n_frames, n_features)
+        return self._batch_features(y[None, :], sr)[0]
+    
+    def _as_mono(self, y):
+        y = np.asarray(y, dtype=self.dtype)
+        if y.ndim > 1:
+            # Downmix (n_samples, n_channels) to mono the way librosa.load does
+            y = y.mean(axis=1)
+        return y
+    
+    def _buffer(self, name, n_frames):
+        """Return an (n_frames, n_features) view of a reusable per-thread buffer."""
+        buffer = getattr(self._workspace, name, None)
+        if buffer is None or len(buffer) < n_frames:
+            buffer = np.empty((n_frames, 3 * self.n_mfcc), dtype=self.dtype)
+            setattr(self._workspace, name, buffer)
+        return buffer[:n_frames]
+    
+    def _extract_into_workspace(self, y, sr):
+        """Extract speech-frame features into the workspace without fresh feature arrays."""
+        y = self._as_mono(y)
+        kernel = get_kernel(sr, self.n_fft, self.n_mfcc, self.hop_length, self.dtype)
+        frames = self._buffer('frames', kernel.n_frames(len(y)))
+        _, energy_db = kernel.features(y[None, :], return_energy=True, out=frames[None])
+        if not self.vad:
+            self.last_vad_ratio = 1.0
+            return frames
         
-        # Calculate delta and delta-delta features
-        delta_mfccs = librosa.feature.delta(mfccs)
-        delta2_mfccs = librosa.feature.delta(mfccs, order=2)
+        mask = self.speech_mask(energy_db)[0]
+        self.last_vad_ratio = float(mask.mean())
+        speech = self._buffer('speech', int(mask.sum()))
+        np.compress(mask, frames, axis=0, out=speech)
+        return speech
+    
+    def extract_features_batch(self, audio_paths):
+        """Extract MFCC features from several audio files in one pass.
         
-        # Stack all features
-        features = np.vstack([mfccs, delta_mfccs, delta2_mfccs])
+        Recordings are grouped by sample rate and length, and each group is
+        framed, transformed and projected with single vectorized operations.
+        Returns a list of (n_frames, n_features) arrays in input order that
+        match what extract_features returns for each file.
+        """
+        results, keys = self._cache_lookup(audio_paths)
+        missing = [i for i, features in enumerate(results) if features is None]
+        if not missing:
+            return results
         
-        return features.T  # Transpose to get (n_frames, n_features)
+        computed = self._extract_batch_uncached([audio_paths[i] for i in missing])
+        for index, features in zip(missing, computed):
+            results[index] = features
+            if self.cache is not None:
+                self.cache.put(keys[index], features)
+                
+        return results
     
-    def process_enrollment_samples(self, audio_files):
-        """Process multiple enrollment samples and return combined features."""
-        all_features = []
+    def _extract_batch_uncached(self, audio_paths):
+        """Load and featurize audio files, batching equal-length recordings."""
+        signals = [load_audio(audio_path) for audio_path in audio_paths]
         
-        for audio_file in audio_files:
-            features = self.extract_features(audio_file)
-            all_features.append(features)
+        # Group recordings that can share one framed array
+        groups = {}
+        for index, (y, sr) in enumerate(signals):
+            groups.setdefault((sr, len(y)), []).append(index)
             
-        # Stack all features
-        combined_features = np.vstack(all_features)
+        results = [None] * len(signals)
+        for (sr, _), indices in groups.items():
+            for start in range(0, len(indices), self.batch_size):
+                chunk = indices[start:start + self.batch_size]
+                batch = np.stack([signals[i][0] for i in chunk])
+                for index, features in zip(chunk, self._batch_features(batch, sr)):
+                    results[index] = features
         
-        # Fit scaler and transform features
-        self.scaler.fit(combined_features)
-        scaled_features = self.scaler.transform(combined_features)
+        # Report the VAD ratio over the whole call, not just the last group
+        total_frames = sum(1 + len(y) // self.hop_length for y, _ in signals)
+        self.last_vad_ratio = sum(len(features) for features in results) / total_frames
+                    
+        return results
+    
+    def iter_features_many(self, audio_paths, workers=None, chunksize=16, max_in_flight=None):
+        """Yield features for many audio files, extracted by a process pool.
         
-        return scaled_features
+        Files are submitted in chunks of `chunksize` and at most
+        `max_in_flight` chunks (default: twice the worker count) are pending
+        at any time, so memory stays bounded however long the list is.
+        Features are yielded in the same order as `audio_paths`. When a cache
+        is configured it is consulted here, and only misses go to the pool.
+        """
+        audio_paths = list(audio_paths)
+        workers = workers or os.cpu_count() or 1
+        max_in_flight = max_in_flight or 2 * workers
+        params = {
+            'n_mfcc': self.n_mfcc,
+            'n_fft': self.n_fft,
+            'hop_length': self.hop_length,
+            'batch_size': self.batch_size,
+            'vad': self.vad,
+            'vad_top_db': self.vad_top_db,
+            'vad_floor_db': self.vad_floor_db,
+            'dtype': self.dtype.name
+        }
+        
+        def collect(results, keys, missing, future):
+            for index, features in zip(missing, future.result() if future else []):
+                results[index] = features
+                if self.cache is not None:
+                    self.cache.put(keys[index], features)
+            return results
+        
+        chunks = (audio_paths[i:i + chunksize] for i in range(0, len(audio_paths), chunksize))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                results, keys = self._cache_lookup(chunk)
+                missing = [i for i, features in enumerate(results) if features is None]
+                future = None
+                if missing:
+                    future = executor.submit(_extract_chunk, params, [chunk[i] for i in missing])
+                pending.append((results, keys, missing, future))
+                if len(pending) >= max_in_flight:
+                    yield from collect(*pending.popleft())
+            while pending:
+                yield from collect(*pending.popleft())
+    
+    def extract_features_many(self, audio_paths, workers=None, chunksize=16, max_in_flight=None):
+        """Extract features for many audio files in parallel, in input order."""
+        return list(self.iter_features_many(audio_paths, workers, chunksize, max_in_flight))
     
-    def process_verification_sample(self, audio_file):
+    def _batch_features(self, batch, sr):
+        """Compute MFCC, delta and delta-delta features for equal-length signals."""
+        kernel = get_kernel(sr, self.n_fft, self.n_mfcc, self.hop_length, self.dtype)
+        if not self.vad:
+            self.last_vad_ratio = 1.0
+            return list(kernel.features(batch))
+        
+        features, energy_db = kernel.features(batch, return_energy=True)
+        mask = self.speech_mask(energy_db)
+        self.last_vad_ratio = float(mask.mean())
+        return [f[m] for f, m in zip(features, mask)]
+    
+    def speech_mask(self, energy_db):
+        """Energy-based voice activity mask over frames, shape (B, frames).
+        
+        A frame is speech when its energy is within `vad_top_db` of the
+        loudest frame and at least `vad_floor_db` above the noise floor
+        (the 5th percentile frame energy) of its own recording. Recordings
+        with less than twice `vad_floor_db` of dynamic range have no
+        detectable silence and are kept whole.
+        """
+        peak = energy_db.max(axis=-1, keepdims=True)
+        floor = np.percentile(energy_db, 5, axis=-1, keepdims=True)
+        threshold = np.maximum(peak - self.vad_top_db, floor + self.vad_floor_db)
+        threshold = np.where(peak - floor < 2 * self.vad_floor_db, -np.inf, threshold)
+        
+        # Never drop the loudest frame
+        return (energy_db > threshold) | (energy_db == peak)
+    
+    def process_enrollment_samples(self, audio_files, return_stats=False, return_lengths=False):
+        """Process multiple enrollment samples and return combined features.
+        
+        Normalization statistics are accumulated file by file, and each file
+        is scaled straight into the combined output array. With
+        `return_stats`, returns (features, stats) so the caller can store the
+        per-user statistics alongside the model. With `return_lengths`, the
+        frame count of each file (in order) is appended to the result.
+        """
+        all_features = self.extract_features_batch(audio_files)
+        
+        stats = RunningStats()
+        for features in all_features:
+            stats.update(features)
+            
+        # Scale each sample into its slice of the combined array
+        scaled_features = np.empty((stats.count, all_features[0].shape[1]), dtype=self.dtype)
+        start = 0
+        for features in all_features:
+            stats.transform(features, out=scaled_features[start:start + len(features)])
+            start += len(features)
+        
+        result = (scaled_features,)
+        if return_stats:
+            result += (stats,)
+        if return_lengths:
+            result += ([len(features) for features in all_features],)
+        return result if len(result) > 1 else scaled_features
+    
+    def _scale(self, features, stats, out=None):
+        """Standardize features with the claimed user's own stats."""
+        if stats is None:
+            raise ValueError("No normalization statistics for this user; re-enroll them")
+        return stats.transform(features, out=out)
+    
+    def process_verification_sample(self, audio_file, stats):
         """Process a single verification sample."""
         features = self.extract_features(audio_file)
-        scaled_features = self.scaler.transform(features)
+        scaled_features = self._scale(features, stats)
+        return scaled_features
+    
+    def process_verification_audio(self, y, sr, stats):
+        """Process a verification sample that is already in memory.
+        
+        Features are computed and scaled in place in this thread's workspace,
+        so the returned array is only valid until the next call on the same
+        thread; copy it if it has to be kept.
+        """
+        features = self._extract_into_workspace(y, sr)
+        scaled_features = self._scale(features, stats, out=features)
         return scaled_features 
\ No newline at end of file